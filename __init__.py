@@ -22,37 +22,12 @@ bl_info = {
     "category" : "Import-Export"
 }
 
-import bpy
-from . import import_mesh
-from . import export_mesh
-from . import import_skel
-from . import import_odr
-from . import import_odd
+try:
+    import bpy
+except ImportError:
+    #outside of blender, only the bpy-free "core" package is available
+    #(for parsing in worker processes, tests or profiling)
+    bpy = None
 
-class GtaIOPanel(bpy.types.Panel):
-    """Panel containing import/export options in the Scene tab"""
-    bl_label = "GTA5 Ped I/O"
-    bl_idname = "SCENE_PT_GTA5_PED"
-    bl_space_type = 'PROPERTIES'
-    bl_region_type = 'WINDOW'
-    bl_context = "scene"
-
-    def draw(self, context):
-        pass
-        #layout = self.layout
-        #curScene = context.scene
-        
-
-def register():
-    import_mesh.register()
-    import_skel.register()
-    import_odr.register()
-    import_odd.register()
-    export_mesh.register()
-
-def unregister():
-    import_mesh.unregister()
-    import_skel.unregister()
-    import_odr.unregister()
-    import_odd.unregister()
-    export_mesh.unregister()
+if bpy is not None:
+    from .registration import register, unregister
@@ -0,0 +1,153 @@
+import bpy
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import tempfile
+import traceback
+import subprocess
+from .core import mesh_writer
+from . import export_mesh
+
+#job settings used when neither the job nor the manifest's "defaults" set them
+DEFAULT_JOB_SETTINGS = {
+    "vertexDeclaration": "S12D0183F",
+    "startingShaderIndex": 0,
+    "applyModifiers": False,
+    "weightPruneThreshold": 0.0,
+    "normalWeldDistance": 0.0,
+    "useExportCache": True,
+}
+
+
+def main(argv = None):
+    """command-line entry point for exporting the meshes listed in a manifest from a background blender session:
+    blender -b peds.blend --python-expr "import sys, io_GTA5Ped.batch_export as b; sys.exit(b.main())" -- jobs.json --summary summary.json
+    The manifest (JSON, or TOML on Python 3.11+) has a "jobs" list of {"object", "path", "vertexDeclaration", "startingShaderIndex", ...}
+    entries and an optional "defaults" entry with the same keys. Relative paths are relative to the manifest.
+    Returns the number of failed jobs"""
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    argParser = argparse.ArgumentParser(prog="batch_export", description="exports the meshes listed in a job manifest")
+    argParser.add_argument("manifest", help="JSON or TOML file listing the export jobs")
+    argParser.add_argument("--summary", help="where the JSON summary is written; it's printed if not provided")
+    argParser.add_argument("--processes", type=int, default=1, help="how many blender processes share the jobs")
+    args = argParser.parse_args(argv)
+
+    exportJobs = read_job_manifest(args.manifest)
+
+    startTime = time.perf_counter()
+
+    if args.processes > 1 and len(exportJobs) > 1 and bpy.data.filepath:
+        jobResults = run_jobs_in_processes(exportJobs, args.processes)
+    else:
+        jobResults = [run_export_job(exportJob) for exportJob in exportJobs]
+
+    summary = {
+        "jobs": jobResults,
+        "failedCount": sum(1 for jobResult in jobResults if jobResult["status"] == "failed"),
+        "totalSeconds": time.perf_counter() - startTime,
+    }
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as writer:
+            json.dump(summary, writer, indent=1)
+    else:
+        print(json.dumps(summary, indent=1))
+
+    return summary["failedCount"]
+
+
+def read_job_manifest(manifestPath):
+    """returns the manifest's jobs as a list of dicts with all settings filled and absolute output paths"""
+    if manifestPath.lower().endswith(".toml"):
+        import tomllib
+
+        with open(manifestPath, 'rb') as reader:
+            manifestData = tomllib.load(reader)
+    else:
+        with open(manifestPath, 'r', encoding='utf-8') as reader:
+            manifestData = json.load(reader)
+
+    manifestDir = os.path.dirname(os.path.abspath(manifestPath))
+    jobDefaults = dict(DEFAULT_JOB_SETTINGS, **manifestData.get("defaults", {}))
+    exportJobs = []
+
+    for jobData in manifestData["jobs"]:
+        exportJob = dict(jobDefaults, **jobData)
+        exportJob["path"] = os.path.join(manifestDir, bpy.path.native_pathsep(exportJob["path"]))
+        exportJobs.append(exportJob)
+
+    return exportJobs
+
+
+def run_export_job(exportJob):
+    """exports the job's object and returns a dict with the job's status ("exported", "skipped" or "failed") and timing"""
+    jobResult = {"object": exportJob["object"], "path": exportJob["path"], "status": "failed", "error": None}
+    startTime = time.perf_counter()
+
+    try:
+        targetObj = bpy.data.objects.get(exportJob["object"])
+
+        if targetObj is None:
+            jobResult["error"] = "object not found"
+        else:
+            writeJob = export_mesh.gather_export_job(targetObj, exportJob["path"], exportJob["vertexDeclaration"], exportJob["startingShaderIndex"],
+                                                     exportJob["applyModifiers"], exportJob["weightPruneThreshold"], exportJob["normalWeldDistance"],
+                                                     exportJob["useExportCache"])
+
+            if writeJob is None:
+                jobResult["error"] = "not a mesh"
+            else:
+                os.makedirs(os.path.dirname(exportJob["path"]), exist_ok=True)
+                jobResult["status"] = "exported" if mesh_writer.run_mesh_write_job(writeJob) else "skipped"
+    except Exception as e:
+        print("batch export: {} failed! {}.{}".format(exportJob["object"], e, traceback.format_exc()))
+        jobResult["error"] = "{}: {}".format(type(e).__name__, e)
+
+    jobResult["seconds"] = time.perf_counter() - startTime
+
+    return jobResult
+
+
+def run_jobs_in_processes(exportJobs, processCount):
+    """splits the jobs among processCount background blender processes opening the current .blend file.
+    Returns the job results in the same order as the jobs. The temporary shard manifests and summaries are removed afterwards"""
+    processCount = min(processCount, len(exportJobs))
+    shardDir = tempfile.mkdtemp(prefix="io_GTA5Ped_batch_")
+    pythonExpr = "import sys, {0}.batch_export as batchExport; sys.exit(batchExport.main())".format(__package__)
+    shards = []
+
+    try:
+        for shardIndex in range(processCount):
+            shardJobs = exportJobs[shardIndex::processCount]
+            manifestPath = os.path.join(shardDir, "jobs_{}.json".format(shardIndex))
+            summaryPath = os.path.join(shardDir, "summary_{}.json".format(shardIndex))
+
+            with open(manifestPath, 'w', encoding='utf-8') as writer:
+                json.dump({"jobs": shardJobs}, writer)
+
+            process = subprocess.Popen([bpy.app.binary_path, "-b", bpy.data.filepath, "--python-expr", pythonExpr,
+                                        "--", manifestPath, "--summary", summaryPath])
+            shards.append((shardJobs, summaryPath, process))
+
+        jobResults = [None] * len(exportJobs)
+
+        for shardIndex, (shardJobs, summaryPath, process) in enumerate(shards):
+            exitCode = process.wait()
+
+            try:
+                with open(summaryPath, 'r', encoding='utf-8') as reader:
+                    shardResults = json.load(reader)["jobs"]
+            except (OSError, ValueError, KeyError):
+                shardResults = [{"object": exportJob["object"], "path": exportJob["path"], "status": "failed",
+                                 "error": "blender process exited with code {}".format(exitCode), "seconds": None} for exportJob in shardJobs]
+
+            jobResults[shardIndex::processCount] = shardResults
+    finally:
+        shutil.rmtree(shardDir, ignore_errors=True)
+
+    return jobResults
@@ -0,0 +1,2 @@
+# This package holds the data classes, readers and writers for the openFormats files.
+# It must never import bpy or mathutils, so that it can be used outside of blender.
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+#entries written with another version are never loaded; bump it when the stored arrays change
+CACHE_FORMAT_VERSION = 4
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "io_GTA5Ped_cache")
+DEFAULT_MAX_SIZE_MB = 1024
+
+
+class ImportCache():
+    """an on-disk cache of data parsed from openFormats files, stored as .npz files (one per parsed file).
+    Entries are keyed by the file's path, size, modification time and content hash,
+    and the least recently used ones are deleted when the cache grows beyond maxSizeBytes"""
+    def __init__(self, cacheDir = DEFAULT_CACHE_DIR, maxSizeBytes = DEFAULT_MAX_SIZE_MB * 1024 * 1024, enabled = True):
+        self.cacheDir = cacheDir
+        self.maxSizeBytes = maxSizeBytes
+        self.enabled = enabled
+
+    def get_entry_path(self, filepath, fileContent, dataKind):
+        """returns the path of the cache entry for the file with the provided content"""
+        fileStat = os.stat(filepath)
+        entryKey = hashlib.sha1()
+
+        for keyPart in (CACHE_FORMAT_VERSION, dataKind, os.path.abspath(filepath), fileStat.st_size, fileStat.st_mtime_ns):
+            entryKey.update(str(keyPart).encode('utf-8'))
+            entryKey.update(b"|")
+
+        entryKey.update(hashlib.sha1(fileContent).digest())
+
+        return os.path.join(self.cacheDir, "{}_{}.npz".format(dataKind, entryKey.hexdigest()))
+
+    def load(self, filepath, fileContent, dataKind):
+        """returns a dict of the arrays stored for this file, or None if there isn't a valid entry"""
+        if not self.enabled:
+            return None
+
+        entryPath = self.get_entry_path(filepath, fileContent, dataKind)
+
+        if not os.path.isfile(entryPath):
+            return None
+
+        try:
+            with np.load(entryPath, allow_pickle=False) as entryData:
+                arrays = {key: entryData[key] for key in entryData.files}
+        except Exception as e:
+            print("Discarding unreadable cache entry {}: {}".format(entryPath, e))
+            remove_file(entryPath)
+            return None
+
+        #mark the entry as recently used (a read-only or shared cache dir shouldn't make a valid entry unusable)
+        try:
+            os.utime(entryPath)
+        except OSError:
+            pass
+
+        return arrays
+
+    def store(self, filepath, fileContent, dataKind, arrays):
+        """writes the dict of arrays as the entry for this file, then evicts old entries if the cache got too big"""
+        if not self.enabled:
+            return
+
+        entryPath = self.get_entry_path(filepath, fileContent, dataKind)
+
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+
+            #write to a temporary file first, so that other Blender instances never read a half-written entry
+            tempPath = "{}.{}.tmp".format(entryPath, os.getpid())
+            with open(tempPath, 'wb') as writer:
+                np.savez(writer, **arrays)
+
+            os.replace(tempPath, entryPath)
+        except OSError as e:
+            print("Failed to write cache entry {}: {}".format(entryPath, e))
+            return
+
+        self.evict_old_entries()
+
+    def evict_old_entries(self):
+        """deletes the least recently used entries until the total size is below maxSizeBytes"""
+        entries = []
+        totalSize = 0
+
+        try:
+            dirEntries = list(os.scandir(self.cacheDir))
+        except OSError as e:
+            print("Failed to list cache dir {}: {}".format(self.cacheDir, e))
+            return
+
+        for entry in dirEntries:
+            if not entry.name.endswith(".npz"):
+                continue
+
+            try:
+                if not entry.is_file():
+                    continue
+
+                entryStat = entry.stat()
+            except OSError:
+                #another Blender instance may have evicted it already
+                continue
+
+            entries.append((entryStat.st_mtime_ns, entryStat.st_size, entry.path))
+            totalSize += entryStat.st_size
+
+        entries.sort()
+
+        for _, entrySize, entryPath in entries:
+            if totalSize <= self.maxSizeBytes:
+                break
+
+            remove_file(entryPath)
+            totalSize -= entrySize
+
+
+def remove_file(filepath):
+    """deletes the file, ignoring errors (another process may have deleted it already)"""
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+
+importCache = ImportCache()
+
+
+def configure_import_cache(cacheDir = None, maxSizeMB = DEFAULT_MAX_SIZE_MB, enabled = True):
+    """changes the settings of the cache used by the importers. A cacheDir of None uses the default one"""
+    importCache.cacheDir = cacheDir or DEFAULT_CACHE_DIR
+    importCache.maxSizeBytes = maxSizeMB * 1024 * 1024
+    importCache.enabled = enabled
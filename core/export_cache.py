@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+#manifests written with another version are ignored; bump it when the manifest or the .mesh formatting changes
+MANIFEST_FORMAT_VERSION = 1
+
+#GeometryData entries that affect the formatted Geometry block
+HASHED_GEOMETRY_STREAMS = ("indices", "vertPositions", "vertNormals", "uvCoords", "uvCoords2",
+                           "vColor", "vColor2", "boneIndexes", "boneWeights", "qtangents")
+
+
+class ExportManifest():
+    """what the last export wrote to a .mesh file: the keys of its header and geometries,
+    the position of each formatted Geometry block in the file, and the file's size and modification time"""
+    def __init__(self):
+        self.headerKey = None
+        self.geometryKeys = [] #one hash per geometry, in the order they were written
+        self.geometrySpans = [] #(start, end) positions of each Geometry block in the file, in bytes
+        self.fileSize = None
+        self.fileMtime = None
+
+    def matches_file(self, meshFilepath):
+        """returns True if the .mesh file still is the one written along with this manifest"""
+        try:
+            fileStat = os.stat(meshFilepath)
+        except OSError:
+            return False
+
+        return fileStat.st_size == self.fileSize and fileStat.st_mtime_ns == self.fileMtime
+
+    def read_geometry_blocks(self, meshFilepath, geometryKeys):
+        """returns a dict with the formatted Geometry block previously written for each of the keys found in this manifest"""
+        keySpans = dict(zip(self.geometryKeys, self.geometrySpans))
+        geometryBlocks = {}
+
+        with open(meshFilepath, 'rb') as reader:
+            for geometryKey in geometryKeys:
+                if geometryKey in keySpans and geometryKey not in geometryBlocks:
+                    blockStart, blockEnd = keySpans[geometryKey]
+                    reader.seek(blockStart)
+                    #the block is written again in text mode, which translates line breaks by itself
+                    geometryBlocks[geometryKey] = reader.read(blockEnd - blockStart).decode('utf-8').replace("\r\n", "\n")
+
+        return geometryBlocks
+
+
+def get_manifest_path(meshFilepath):
+    """returns the path of the manifest stored next to the .mesh file"""
+    return meshFilepath + ".manifest.json"
+
+
+def load_manifest(meshFilepath):
+    """returns the ExportManifest of the .mesh file, or None if there isn't a valid one for the file as it is now"""
+    try:
+        with open(get_manifest_path(meshFilepath), 'r', encoding='utf-8') as reader:
+            manifestData = json.load(reader)
+
+        if manifestData.get("version") != MANIFEST_FORMAT_VERSION:
+            return None
+
+        manifest = ExportManifest()
+        manifest.headerKey = manifestData["headerKey"]
+        manifest.geometryKeys = manifestData["geometryKeys"]
+        manifest.geometrySpans = [tuple(span) for span in manifestData["geometrySpans"]]
+        manifest.fileSize = manifestData["fileSize"]
+        manifest.fileMtime = manifestData["fileMtime"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if not manifest.matches_file(meshFilepath):
+        return None
+
+    return manifest
+
+
+def save_manifest(meshFilepath, headerKey, geometryKeys, geometrySpans):
+    """writes the manifest of the .mesh file that was just written"""
+    fileStat = os.stat(meshFilepath)
+    manifestData = {
+        "version": MANIFEST_FORMAT_VERSION,
+        "headerKey": headerKey,
+        "geometryKeys": geometryKeys,
+        "geometrySpans": [list(span) for span in geometrySpans],
+        "fileSize": fileStat.st_size,
+        "fileMtime": fileStat.st_mtime_ns,
+    }
+
+    with open(get_manifest_path(meshFilepath), 'w', encoding='utf-8') as writer:
+        json.dump(manifestData, writer)
+
+
+def remove_manifest(meshFilepath):
+    """deletes the manifest of the .mesh file, if there is one"""
+    try:
+        os.remove(get_manifest_path(meshFilepath))
+    except OSError:
+        pass
+
+
+def get_header_key(geometryDatas, vertDeclarationType, startingShaderIndex, isRigged, boneCount):
+    """returns a hash of everything written to the .mesh file outside of the Geometry blocks"""
+    keyParts = [MANIFEST_FORMAT_VERSION, vertDeclarationType, startingShaderIndex, isRigged, boneCount]
+
+    for geom in geometryDatas:
+        keyParts.append(geom.bounds)
+
+    return hashlib.sha1(repr(keyParts).encode('utf-8')).hexdigest()
+
+
+def get_geometry_key(geom, vertDeclarationType, startingShaderIndex):
+    """returns a hash of everything written to the geometry's formatted Geometry block"""
+    keyHash = hashlib.sha1(repr((MANIFEST_FORMAT_VERSION, vertDeclarationType, startingShaderIndex + geom.shaderIndex)).encode('utf-8'))
+
+    for streamName in HASHED_GEOMETRY_STREAMS:
+        stream = np.ascontiguousarray(getattr(geom, streamName))
+        keyHash.update(repr((streamName, stream.dtype.str, stream.shape)).encode('utf-8'))
+        keyHash.update(stream.tobytes())
+
+    return keyHash.hexdigest()
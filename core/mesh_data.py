@@ -0,0 +1,716 @@
+import os.path
+import mmap
+import traceback
+import numpy as np
+from . import reader_utils
+
+#GeometryData entries with one row per vertex
+VERTEX_STREAMS = ("vertPositions", "vertNormals", "uvCoords", "uvCoords2",
+                  "vColor", "vColor2", "boneIndexes", "boneWeights", "qtangents")
+
+#GeometryData entries stored in the import cache
+CACHED_GEOMETRY_STREAMS = ("indices",) + VERTEX_STREAMS
+
+#how many candidate vertex pairs get_coincident_vertex_groups checks at once
+MAX_CANDIDATE_PAIRS = 1 << 20
+
+
+def read_mesh_file(filepath, importCache = None):
+    """returns a list of GeometryData with the data of all geometries in the .mesh file, or None if reading fails.
+    If an ImportCache is provided, it is checked before parsing and filled after it"""
+    with open(filepath, 'rb') as reader:
+        fileContent = reader.read()
+
+    if importCache is not None:
+        cachedArrays = importCache.load(filepath, fileContent, "mesh")
+
+        if cachedArrays is not None:
+            print("Using cached data for mesh {}".format(filepath))
+            return arrays_to_geometries(cachedArrays)
+
+    try:
+        rootBlock = reader_utils.parse_openformats_data(fileContent)
+    except Exception as e:
+        print("Mesh file parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    geometries = blocks_to_geometries(rootBlock)
+
+    if geometries is not None and importCache is not None:
+        importCache.store(filepath, fileContent, "mesh", geometries_to_arrays(geometries))
+
+    return geometries
+
+
+def blocks_to_geometries(rootBlock):
+    """returns a list of GeometryData with the data of the file's Geometry blocks, or None if reading fails"""
+    #"Version" header
+    versionBlock = rootBlock.find_child("Version")
+    
+    if versionBlock is None:
+        return
+    
+    print("Version OK")
+    
+    geometriesBlock = versionBlock.find_child("Geometries")
+    
+    if geometriesBlock is None:
+        return
+    
+    print("Reading Geometries Data...")
+    
+    try:
+        return read_geometries(geometriesBlock)
+    except Exception as e:
+        print("Geometry parsing failed! {}.{}".format(e, traceback.format_exc()))
+
+
+
+def read_geometries(geometriesBlock):
+    """calls read_geometry_data for each Geometry entry"""
+    geometries = []
+    
+    for geometryBlock in geometriesBlock.find_children("Geometry"):
+        print("Reading Geometry...")
+        geometries.append(read_geometry_data(geometryBlock))
+              
+    return geometries
+    
+
+def read_geometry_data(geometryBlock):
+    """returns a GeometryData object with the data retrieved"""
+    geomData = GeometryData()
+    
+    for entry in geometryBlock.children:
+        if entry.keyword == "ShaderIndex":
+            geomData.shaderIndex = int(entry.args[0])
+        elif entry.keyword == "Indices":
+            print("Reading Geometry Indices...")
+            parse_indices_text(entry.read_raw_text(), get_declared_count(entry), geomData)
+        elif entry.keyword == "Vertices":
+            print("Reading Geometry Vertices...")
+            parse_vertices_text(entry.read_raw_text(), get_declared_count(entry), geomData)
+                
+    return geomData
+
+
+def validate_triangles(indices, vertCount):
+    """returns an (n, 3) int array with the index list's valid triangles, in their original order, and a TriangleReport.
+    Triangles using indices outside the vertex range, using the same vertex more than once
+    or using the same vertices as an earlier triangle are left out"""
+    indices = np.asarray(indices, dtype=np.int32)
+    triangleCount = len(indices) // 3
+    triangles = indices[:triangleCount * 3].reshape(-1, 3)
+    report = TriangleReport(triangleCount, len(indices) % 3 != 0)
+
+    isOutOfRange = ((triangles < 0) | (triangles >= vertCount)).any(axis=1)
+
+    sortedTriangles = np.sort(triangles, axis=1)
+    isDegenerate = (sortedTriangles[:, 0] == sortedTriangles[:, 1]) | (sortedTriangles[:, 1] == sortedTriangles[:, 2])
+    isDegenerate &= ~isOutOfRange
+
+    #each remaining triangle gets a key identifying its set of vertices; only the first triangle with each key is kept
+    candidates = np.flatnonzero(~(isOutOfRange | isDegenerate))
+    triangleKeys = get_triangle_keys(sortedTriangles[candidates], vertCount)
+    _, firstOccurrences = np.unique(triangleKeys, return_index=True)
+
+    isKept = np.zeros(triangleCount, dtype=bool)
+    isKept[candidates[firstOccurrences]] = True
+
+    report.outOfRangeTriangles = np.flatnonzero(isOutOfRange)
+    report.degenerateTriangles = np.flatnonzero(isDegenerate)
+    report.duplicateTriangles = np.setdiff1d(candidates, candidates[firstOccurrences], assume_unique=True)
+
+    return triangles[isKept], report
+
+
+def combine_triangle_reports(triangleReports):
+    """returns a TriangleReport for the concatenated index lists of the reports' geometries.
+    The positions of the skipped triangles are offset by the triangle counts of the reports before them"""
+    combinedReport = TriangleReport(sum(report.triangleCount for report in triangleReports),
+                                    any(report.hasIncompleteTriangle for report in triangleReports))
+    triangleOffsets = np.cumsum([0] + [report.triangleCount for report in triangleReports[:-1]])
+
+    for listName in ("outOfRangeTriangles", "degenerateTriangles", "duplicateTriangles"):
+        setattr(combinedReport, listName, np.concatenate([np.asarray(getattr(report, listName), dtype=np.int64) + triangleOffset
+                                                          for report, triangleOffset in zip(triangleReports, triangleOffsets)]))
+
+    return combinedReport
+
+
+def get_triangle_keys(sortedTriangles, vertCount):
+    """returns one value per (n, 3) row of sorted vertex indices, equal only for rows with the same indices"""
+    if vertCount ** 3 < 2 ** 63:
+        sortedTriangles = sortedTriangles.astype(np.int64)
+        return (sortedTriangles[:, 0] * vertCount + sortedTriangles[:, 1]) * vertCount + sortedTriangles[:, 2]
+
+    #too many vertices to pack the indices in a single int; compare the rows' bytes instead
+    return np.ascontiguousarray(sortedTriangles).view(np.dtype((np.void, sortedTriangles.itemsize * 3))).ravel()
+
+
+def get_unique_rows(rows):
+    """returns the position of the first occurrence of each unique row of the 2D int array, sorted by the rows' values,
+    and the index (in those unique rows) of the row at each position"""
+    rowCount = len(rows)
+
+    if rowCount == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    #lexsort is stable, so the first row of each group of equal rows is its first occurrence
+    sortOrder = np.lexsort(rows.T[::-1])
+    sortedRows = rows[sortOrder]
+
+    isFirstOfGroup = np.empty(rowCount, dtype=bool)
+    isFirstOfGroup[0] = True
+    isFirstOfGroup[1:] = (sortedRows[1:] != sortedRows[:-1]).any(axis=1)
+
+    rowGroups = np.empty(rowCount, dtype=np.int64)
+    rowGroups[sortOrder] = np.cumsum(isFirstOfGroup) - 1
+
+    return sortOrder[isFirstOfGroup], rowGroups
+
+
+def get_vertex_group_assignments(boneIndexes, boneWeights):
+    """returns a list of (boneIndex, [(weight, vertIndexList), ...]) with all the nonzero weights, grouped by bone and then by weight value.
+    Bones are listed in the order they first appear in the vertices; if a vertex lists a bone more than once, its last weight is used"""
+    boneWeights = np.asarray(boneWeights, dtype=np.float64)
+
+    if boneWeights.size == 0:
+        return []
+
+    vertCount, weightsPerVert = boneWeights.shape
+    vertIndices = np.repeat(np.arange(vertCount, dtype=np.int32), weightsPerVert)
+    bones = np.asarray(boneIndexes, dtype=np.int32).ravel()
+    weights = boneWeights.ravel()
+
+    hasWeight = weights > 0.0
+    vertIndices, bones, weights = vertIndices[hasWeight], bones[hasWeight], weights[hasWeight]
+
+    if len(weights) == 0:
+        return []
+
+    uniqueBones, firstAppearances = np.unique(bones, return_index=True)
+    bonesInFileOrder = uniqueBones[np.argsort(firstAppearances)]
+
+    #drop all but the last weight of repeated (vertex, bone) pairs
+    lowestBone = int(bones.min())
+    pairKeys = vertIndices.astype(np.int64) * (int(bones.max()) - lowestBone + 1) + (bones - lowestBone)
+    _, lastOccurrences = np.unique(pairKeys[::-1], return_index=True)
+    isKept = np.zeros(len(weights), dtype=bool)
+    isKept[len(weights) - 1 - lastOccurrences] = True
+    vertIndices, bones, weights = vertIndices[isKept], bones[isKept], weights[isKept]
+
+    #sort by bone, then by weight, and split wherever one of them changes
+    order = np.lexsort((weights, bones))
+    vertIndices, bones, weights = vertIndices[order], bones[order], weights[order]
+    splits = np.flatnonzero((np.diff(bones) != 0) | (np.diff(weights) != 0)) + 1
+
+    groupStarts = np.concatenate(([0], splits)).tolist()
+    groupEnds = splits.tolist() + [len(weights)]
+    vertIndices = vertIndices.tolist()
+    weightsPerBone = {}
+
+    for bone, weight, start, end in zip(bones[groupStarts].tolist(), weights[groupStarts].tolist(), groupStarts, groupEnds):
+        weightsPerBone.setdefault(bone, []).append((weight, vertIndices[start:end]))
+
+    #list the bones in the order they first appeared
+    return [(bone, weightsPerBone[bone]) for bone in bonesInFileOrder.tolist()]
+
+
+def limit_vertex_weights(vertGroupWeights, maxWeights = 4, pruneThreshold = 0.0):
+    """returns the columns and values of the (up to) maxWeights biggest weights in each row of the (n, k) weight array,
+    as (n, maxWeights) arrays, with each row's weights renormalized to add up to 1.
+    Weights below pruneThreshold are removed first. The kept weights stay in their column order, followed by the unused slots,
+    which have column -1 and weight 0"""
+    vertGroupWeights = np.asarray(vertGroupWeights, dtype=np.float64)
+    vertCount, groupCount = vertGroupWeights.shape
+    weights = np.where(vertGroupWeights >= pruneThreshold, vertGroupWeights, 0.0)
+
+    if groupCount == 0:
+        return np.full((vertCount, maxWeights), -1, dtype=np.int64), np.zeros((vertCount, maxWeights))
+
+    if groupCount > maxWeights:
+        columns = np.argpartition(-weights, maxWeights - 1, axis=1)[:, :maxWeights]
+        columns.sort(axis=1)
+    else:
+        columns = np.full((vertCount, maxWeights), -1, dtype=np.int64)
+        columns[:, :groupCount] = np.arange(groupCount)
+
+    keptWeights = np.where(columns >= 0, np.take_along_axis(weights, np.maximum(columns, 0), axis=1), 0.0)
+
+    #move the unused slots to the end
+    isUnused = keptWeights <= 0.0
+    slotOrder = np.argsort(isUnused, axis=1, kind='stable')
+    columns = np.take_along_axis(np.where(isUnused, -1, columns), slotOrder, axis=1)
+    keptWeights = np.take_along_axis(keptWeights, slotOrder, axis=1)
+
+    weightSums = keptWeights.sum(axis=1, keepdims=True)
+    np.divide(keptWeights, weightSums, out=keptWeights, where=weightSums > 0.0)
+
+    return columns, keptWeights
+
+
+def quantize_bone_weights(boneWeights):
+    """
+    GTA5 requires bone weights to be normalized and quantized in the 0-255 range. 
+    Otherwise it can happen that vertex positions become distorted. Especial for facial bones.
+    Returns an (n, k) uint8 array with each vertex's weights adding up to 255,
+    and an array with the indices of the vertices without any weight (their weights are all kept at 0)
+    """
+    boneWeights = np.asarray(boneWeights, dtype=np.float64)
+
+    # summed one column at a time, in the same order as a python sum() of each vertex's weights
+    wSums = np.zeros(len(boneWeights))
+    for column in boneWeights.T:
+        wSums += column
+
+    isWeighted = wSums > 0
+    quantizedWeights = np.zeros(boneWeights.shape, dtype=np.int64)
+
+    # normalize weights and convert to the 0-255 range (rounding half to even, like python's round)
+    quantizedWeights[isWeighted] = np.rint(boneWeights[isWeighted] / wSums[isWeighted, None] * 255)
+
+    # fix normalisation by making sure the sum is always 255:
+    # the offset is spread over the nonzero weights, one unit at a time, starting from the first one
+    wSumOffsets = np.where(isWeighted, 255 - quantizedWeights.sum(axis=1), 0)
+
+    while np.any(wSumOffsets != 0):
+        for column in quantizedWeights.T:
+            steps = np.sign(wSumOffsets)
+            isAdjusted = (steps != 0) & (column > 0)
+            column[isAdjusted] += steps[isAdjusted]
+            wSumOffsets[isAdjusted] -= steps[isAdjusted]
+
+    return quantizedWeights.astype(np.uint8), np.flatnonzero(~isWeighted)
+
+
+def get_coincident_vertex_groups(positions, tolerance):
+    """returns, for each of the (n, 3) positions, the smallest index of the positions it's coincident with
+    (closer than tolerance on every axis, directly or through other coincident positions)"""
+    positions = np.asarray(positions, dtype=np.float64)
+    vertCount = len(positions)
+    vertGroups = np.arange(vertCount)
+
+    if vertCount == 0 or tolerance <= 0.0:
+        return vertGroups
+
+    #positions are hashed to cells twice as big as the tolerance, so that coincident positions can only be in
+    #the same cell or in the neighbour cell at the side of the nearest border, on each axis (8 cells to look at)
+    cellSize = tolerance * 2
+    cells = np.floor(positions / cellSize).astype(np.int64)
+    neighbourSides = np.where(positions - cells * cellSize < tolerance, -1, 1)
+
+    cellOffsets = np.array([[(mask >> axis) & 1 for axis in range(3)] for mask in range(8)], dtype=np.int64)
+    searchedCells = cells[None, :, :] + cellOffsets[:, None, :] * neighbourSides[None, :, :]
+    cellIds = get_cell_keys(searchedCells.reshape(-1, 3)).reshape(8, vertCount)
+
+    #the first offset is the vertices' own cell
+    vertOrder = np.argsort(cellIds[0], kind='stable')
+    sortedCellIds = cellIds[0][vertOrder]
+    cellStarts = np.searchsorted(sortedCellIds, cellIds, 'left').ravel()
+    cellSizes = np.searchsorted(sortedCellIds, cellIds, 'right').ravel() - cellStarts
+
+    #every (vertex, vertex in a searched cell) pair that is within tolerance.
+    #The candidate pairs are checked in chunks, so that crowded cells don't need all of them in memory at once
+    queryVerts = np.tile(np.arange(vertCount), 8)
+    pairCounts = np.cumsum(cellSizes)
+    chunkEnds = np.searchsorted(pairCounts, np.arange(MAX_CANDIDATE_PAIRS, pairCounts[-1], MAX_CANDIDATE_PAIRS), 'right')
+    pairVertChunks = []
+    pairOtherChunks = []
+
+    for chunkStart, chunkEnd in zip(np.concatenate([[0], chunkEnds]), np.concatenate([chunkEnds, [len(cellSizes)]])):
+        chunkSizes = cellSizes[chunkStart:chunkEnd]
+        pairVerts = np.repeat(queryVerts[chunkStart:chunkEnd], chunkSizes)
+        pairOffsets = np.arange(len(pairVerts)) - np.repeat(np.cumsum(chunkSizes) - chunkSizes, chunkSizes)
+        pairOthers = vertOrder[np.repeat(cellStarts[chunkStart:chunkEnd], chunkSizes) + pairOffsets]
+
+        isCoincident = (pairVerts != pairOthers) & (np.abs(positions[pairVerts] - positions[pairOthers]) <= tolerance).all(axis=1)
+        pairVertChunks.append(pairVerts[isCoincident])
+        pairOtherChunks.append(pairOthers[isCoincident])
+
+    pairVerts = np.concatenate(pairVertChunks)
+    pairOthers = np.concatenate(pairOtherChunks)
+
+    #the pairs are listed both ways, so spreading the smallest index through them until nothing changes groups them all
+    while True:
+        newGroups = vertGroups.copy()
+        np.minimum.at(newGroups, pairVerts, vertGroups[pairOthers])
+        newGroups = newGroups[newGroups]
+
+        if np.array_equal(newGroups, vertGroups):
+            return vertGroups
+
+        vertGroups = newGroups
+
+
+def get_cell_keys(cells):
+    """returns one int value per (n, 3) row of cell coordinates, equal only for rows with the same coordinates"""
+    cellMins = cells.min(axis=0)
+    cellRanges = cells.max(axis=0) - cellMins + 1
+
+    if np.prod(cellRanges.astype(np.float64)) < 2 ** 62:
+        cells = cells - cellMins
+        return (cells[:, 0] * cellRanges[1] + cells[:, 1]) * cellRanges[2] + cells[:, 2]
+
+    #too many cells to pack the coordinates in a single int; number the unique rows instead
+    return get_unique_rows(cells)[1]
+
+
+def weld_coincident_normals(positions, normals, tolerance):
+    """returns the (n, 3) normals with the ones of coincident positions (see get_coincident_vertex_groups) replaced by their average,
+    and the number of vertices that were coincident with another one. The other vertices keep their own normals"""
+    normals = np.asarray(normals, dtype=np.float32)
+    vertGroups = get_coincident_vertex_groups(positions, tolerance)
+    isMatched = np.bincount(vertGroups, minlength=len(vertGroups))[vertGroups] > 1
+
+    normalSums = np.zeros((len(normals), 3))
+    np.add.at(normalSums, vertGroups[isMatched], normals[isMatched])
+    weldedNormals = normalSums[vertGroups]
+    normalLengths = np.linalg.norm(weldedNormals, axis=1)
+
+    #normals that cancel each other out are kept as they were
+    isWelded = isMatched & (normalLengths > 1e-6)
+    weldedNormals = normals.copy()
+    weldedNormals[isWelded] = normalSums[vertGroups[isWelded]] / normalLengths[isWelded, None]
+
+    return weldedNormals, int(np.count_nonzero(isMatched))
+
+
+def merge_geometries_sharing_shaders(geometries):
+    """returns a list with one GeometryData per shaderIndex, in the order they first appear.
+    The data of geometries sharing a shaderIndex is concatenated into a single new GeometryData"""
+    geometriesPerShader = {}
+
+    for geometry in geometries:
+        geometriesPerShader.setdefault(geometry.shaderIndex, []).append(geometry)
+
+    return [merge_geometries(sameShaderGeoms) for sameShaderGeoms in geometriesPerShader.values()]
+
+
+def merge_geometries(geometries):
+    """returns a GeometryData with the vertices and indices of all the geometries (or the only one, if there's just one).
+    Streams missing in some of the geometries, like the second uvs, are filled with zeros for their vertices.
+    Only the valid triangles of each geometry are kept; what was left out is in the result's triangleReport"""
+    if len(geometries) == 1:
+        return geometries[0]
+
+    mergedGeom = GeometryData()
+    mergedGeom.shaderIndex = geometries[0].shaderIndex
+
+    vertCounts = [len(geom.vertPositions) for geom in geometries]
+    indexOffsets = np.cumsum([0] + vertCounts[:-1])
+
+    #each geometry's triangles are validated against its own vertices, because after offsetting them
+    #a bad index could point to a vertex of another geometry
+    pieceTriangles = []
+    pieceReports = []
+
+    for geom, vertCount, indexOffset in zip(geometries, vertCounts, indexOffsets):
+        triangles, triangleReport = validate_triangles(geom.indices, vertCount)
+        pieceTriangles.append(triangles.ravel() + indexOffset)
+        pieceReports.append(triangleReport)
+
+    mergedGeom.indices = np.concatenate(pieceTriangles).astype(np.int32)
+    mergedGeom.triangleReport = combine_triangle_reports(pieceReports)
+
+    for streamName in VERTEX_STREAMS:
+        streams = [np.asarray(getattr(geom, streamName)) for geom in geometries]
+        filledStreams = [stream for stream in streams if len(stream) > 0]
+
+        if len(filledStreams) == 0:
+            continue
+
+        rowShape = filledStreams[0].shape[1:]
+        streams = [stream if len(stream) > 0 else np.zeros((vertCount,) + rowShape, dtype=filledStreams[0].dtype)
+                   for stream, vertCount in zip(streams, vertCounts)]
+        setattr(mergedGeom, streamName, np.concatenate(streams))
+
+    return mergedGeom
+
+
+def geometries_to_arrays(geometries):
+    """returns a dict with the data of all geometries as arrays, for storing in the import cache"""
+    arrays = {"geometryCount": np.array(len(geometries))}
+
+    for i, geom in enumerate(geometries):
+        arrays["{}_shaderIndex".format(i)] = np.array(geom.shaderIndex)
+
+        for streamName in CACHED_GEOMETRY_STREAMS:
+            arrays["{}_{}".format(i, streamName)] = np.asarray(getattr(geom, streamName))
+
+    return arrays
+
+
+def arrays_to_geometries(arrays):
+    """returns a list of GeometryData from a dict made by geometries_to_arrays"""
+    geometries = []
+
+    for i in range(int(arrays["geometryCount"])):
+        geom = GeometryData()
+        geom.shaderIndex = int(arrays["{}_shaderIndex".format(i)])
+
+        for streamName in CACHED_GEOMETRY_STREAMS:
+            setattr(geom, streamName, arrays["{}_{}".format(i, streamName)])
+
+        geometries.append(geom)
+
+    return geometries
+
+
+def index_mesh_file(filepath):
+    """scans the structure of the .mesh file without parsing any vertex or index data.
+    Returns a MeshFileIndex, with a LazyGeometry for each Geometry block"""
+    meshIndex = MeshFileIndex()
+    meshIndex.path = filepath
+
+    with open(filepath, 'rb') as reader:
+        if os.fstat(reader.fileno()).st_size == 0:
+            return meshIndex
+
+        with mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            rootBlock = reader_utils.parse_openformats_data(data)
+
+    versionBlock = rootBlock.find_child("Version")
+
+    if versionBlock is None:
+        return meshIndex
+
+    for entry in versionBlock.children:
+        if entry.keyword == "Skinned":
+            meshIndex.skinned = entry.args[0] == "True"
+        elif entry.keyword == "BoneCount":
+            meshIndex.boneCount = int(entry.args[0])
+        elif entry.keyword == "Bounds":
+            for aabbBlock in entry.find_children("Aabb"):
+                meshIndex.bounds.append(read_aabb(aabbBlock))
+        elif entry.keyword == "Geometries":
+            for geometryBlock in entry.find_children("Geometry"):
+                meshIndex.geometries.append(index_geometry_block(geometryBlock, filepath))
+
+    #there should be one Aabb per Geometry, in the same order
+    if len(meshIndex.bounds) == len(meshIndex.geometries):
+        for geometry, bounds in zip(meshIndex.geometries, meshIndex.bounds):
+            geometry.bounds = bounds
+
+    return meshIndex
+
+
+def index_geometry_block(geometryBlock, filepath):
+    """returns a LazyGeometry with the Geometry block's metadata and the location of its data in the file"""
+    lazyGeom = LazyGeometry(filepath)
+    lazyGeom.offset = geometryBlock.offset
+
+    for entry in geometryBlock.children:
+        if entry.keyword == "ShaderIndex":
+            lazyGeom.shaderIndex = int(entry.args[0])
+        elif entry.keyword == "VertexDeclaration":
+            lazyGeom.vertexDeclaration = entry.args[0]
+        elif entry.keyword == "Indices":
+            lazyGeom.indexCount = get_declared_count(entry)
+            lazyGeom.indicesSpan = entry.rawSpan
+        elif entry.keyword == "Vertices":
+            lazyGeom.vertexCount = get_declared_count(entry)
+            lazyGeom.verticesSpan = entry.rawSpan
+
+    return lazyGeom
+
+
+def read_aabb(aabbBlock):
+    """returns a dict with the 'min' and 'max' tuples declared in the Aabb block"""
+    bounds = {}
+
+    for entry in aabbBlock.children:
+        if entry.keyword == "Min":
+            bounds['min'] = tuple(map(float, entry.args))
+        elif entry.keyword == "Max":
+            bounds['max'] = tuple(map(float, entry.args))
+
+    return bounds
+
+
+def get_declared_count(block):
+    """returns the entry count declared in blocks like 'Vertices 1234', or None if there isn't a valid one"""
+    if len(block.args) == 0 or not block.args[0].isdigit():
+        return None
+
+    return int(block.args[0])
+
+
+def parse_indices_text(text, indexCount, geomData):
+    """stores all indices found in the text as an int array in geomData.
+    If indexCount isn't None, it is checked against the number of indices found"""
+    indices = np.fromstring(text, dtype=np.int32, sep=" ")
+
+    if indexCount is not None and len(indices) != indexCount:
+        raise ValueError("expected {} indices, found {}".format(indexCount, len(indices)))
+
+    geomData.indices = indices
+
+
+def parse_vertices_text(text, vertCount, geomData):
+    """parses all vertex lines in the text at once, storing each stream in geomData as an array.
+    If vertCount is None, it is taken from the number of lines in the text"""
+    if vertCount is None:
+        vertCount = len([line for line in text.splitlines() if line.strip() != ''])
+
+    if vertCount == 0:
+        return
+
+    #all lines share the same layout, so we get the size of each "/"-separated entry from the first one
+    firstLine = text.lstrip().partition("\n")[0]
+    entrySizes = [len(entry.split()) for entry in firstLine.split("/")]
+    entryStarts = np.cumsum([0] + entrySizes)
+    lineSize = entryStarts[-1]
+
+    values = np.fromstring(text.replace("/", " "), dtype=np.float64, sep=" ")
+
+    if len(values) != vertCount * lineSize:
+        raise ValueError("expected {} vertices with {} values each, found {} values".format(vertCount, lineSize, len(values)))
+
+    values = values.reshape(vertCount, lineSize)
+
+    def get_entry(entryIndex, dtype):
+        return values[:, entryStarts[entryIndex]:entryStarts[entryIndex + 1]].astype(dtype)
+
+    geomData.vertPositions = get_entry(0, np.float32)
+    geomData.boneWeights = get_entry(1, np.float32)
+    geomData.boneIndexes = get_entry(2, np.int32)
+    geomData.boneIndexes = geomData.boneIndexes.astype(get_bone_index_dtype(geomData.boneIndexes.max(initial=0) + 1))
+    geomData.vertNormals = get_entry(3, np.float32)
+    geomData.vColor = to_byte_values(get_entry(4, np.float64))
+    geomData.vColor2 = to_byte_values(get_entry(5, np.float64))
+
+    #uvs (they are flipped in the y axis!)
+    geomData.uvCoords = get_entry(6, np.float32)
+    geomData.uvCoords[:, 1] *= -1
+
+    #second uvs (only available in high opaque)
+    if len(entrySizes) >= 9:
+        geomData.uvCoords2 = get_entry(7, np.float32)
+        geomData.uvCoords2[:, 1] *= -1
+    else:
+        geomData.uvCoords2 = np.zeros((0, 2), dtype=np.float32)
+
+    #tangents are always the last entry, if present
+    if len(entrySizes) >= 8:
+        geomData.qtangents = get_entry(len(entrySizes) - 1, np.float32)
+    else:
+        geomData.qtangents = np.zeros((0, 4), dtype=np.float32)
+
+
+def to_byte_values(values):
+    """returns the values rounded and clamped to the 0-255 range, as an uint8 array"""
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+def get_bone_index_dtype(boneCount):
+    """returns the smallest unsigned int type able to store indexes of boneCount bones"""
+    return np.uint8 if boneCount <= 256 else np.uint16
+    
+
+class MeshFileIndex():
+    """metadata of a .mesh file, with handles for loading each geometry's data only when needed"""
+    def __init__(self):
+        self.path = None
+        self.skinned = False
+        self.boneCount = 0
+        self.bounds = [] #list of dicts with 'min' and 'max' tuples, one per Aabb
+        self.geometries = [] #list of LazyGeometry
+
+
+class LazyGeometry():
+    """a Geometry block of a .mesh file whose vertices and indices are only parsed when load_geometry_data is called"""
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.offset = 0 #position of the Geometry block in the file, in bytes
+        self.shaderIndex = 0
+        self.vertexDeclaration = None
+        self.indexCount = None
+        self.vertexCount = None
+        self.bounds = None
+        self.indicesSpan = None #(start, end) positions of the Indices data in the file
+        self.verticesSpan = None #(start, end) positions of the Vertices data in the file
+        self.geometryData = None
+
+    def load_geometry_data(self):
+        """parses this geometry's data from the file (only the first time it is called) and returns it as a GeometryData"""
+        if self.geometryData is not None:
+            return self.geometryData
+
+        geomData = GeometryData()
+        geomData.shaderIndex = self.shaderIndex
+
+        with open(self.filepath, 'rb') as reader:
+            if self.indicesSpan is not None:
+                parse_indices_text(read_file_span(reader, self.indicesSpan), self.indexCount, geomData)
+
+            if self.verticesSpan is not None:
+                parse_vertices_text(read_file_span(reader, self.verticesSpan), self.vertexCount, geomData)
+
+        self.geometryData = geomData
+
+        return geomData
+
+
+def read_file_span(reader, span):
+    """returns the text between the (start, end) positions of the file opened in binary mode"""
+    reader.seek(span[0])
+    return reader.read(span[1] - span[0]).decode('utf-8')
+
+
+class TriangleReport():
+    """the problems found in a geometry's index list by validate_triangles.
+    Each list holds the positions (in the index list, divided by 3) of the skipped triangles"""
+    def __init__(self, triangleCount = 0, hasIncompleteTriangle = False):
+        self.triangleCount = triangleCount
+        self.hasIncompleteTriangle = hasIncompleteTriangle
+        self.outOfRangeTriangles = []
+        self.degenerateTriangles = []
+        self.duplicateTriangles = []
+
+    def skipped_count(self):
+        """the total of skipped triangles, including an incomplete one at the end of the index list"""
+        return len(self.outOfRangeTriangles) + len(self.degenerateTriangles) + len(self.duplicateTriangles) + \
+            (1 if self.hasIncompleteTriangle else 0)
+
+    def __str__(self):
+        return "{} duplicate, {} degenerate and {} out of range faces were skipped{}".format(
+            len(self.duplicateTriangles), len(self.degenerateTriangles), len(self.outOfRangeTriangles),
+            ", the index count isn't a multiple of 3" if self.hasIncompleteTriangle else "")
+
+
+class GeometryData():
+    """class representing most of the data stored in a .mesh file, especially in the 'Geometry' sections.
+    Each per-vertex stream is a numpy array with one row per vertex; optional streams have no rows when missing"""
+    __slots__ = ("mesh", "meshObj", "shaderIndex", "indices", "vertPositions", "vertNormals", "uvCoords", "uvCoords2",
+                 "vColor", "vColor2", "boneIndexes", "boneWeights", "qtangents", "bounds", "triangleReport")
+
+    def __init__(self, vertCount = 0):
+        self.mesh = None
+        self.meshObj = None
+        self.shaderIndex = 0
+        self.indices = np.zeros(0, dtype=np.int32) #vertex indices, in the winding order, in order to make faces
+        self.vertPositions = np.zeros((vertCount, 3), dtype=np.float32)
+        self.vertNormals = np.zeros((vertCount, 3), dtype=np.float32)
+        self.uvCoords = np.zeros((vertCount, 2), dtype=np.float32) #y axis is flipped, apparently
+        self.uvCoords2 = np.zeros((vertCount, 2), dtype=np.float32) #y axis is flipped too. Not necessarily used
+        self.vColor = np.zeros((vertCount, 4), dtype=np.uint8) #vertex colors from channel 1, in the 0-255 range
+        self.vColor2 = np.zeros((vertCount, 4), dtype=np.uint8) #vertex colors from channel 2, in the 0-255 range
+        self.boneIndexes = np.zeros((vertCount, 4), dtype=np.uint8) #uint16 if there are more than 256 bones
+        self.boneWeights = np.zeros((vertCount, 4), dtype=np.float32) #weights in the 0-1 range, as stored in the file
+        self.qtangents = np.zeros((vertCount, 4), dtype=np.float32) #tangents (x,y,z) and bitangents signs (w), representing tangent space (for normal mapping)
+        self.bounds = None #dict with 'max' and 'min' lists of 3 floats
+        self.triangleReport = None #TriangleReport of the triangles left out when merging geometries
+
+    def calculate_geometry_bounds(self):
+        """fills this geometry's 'bounds' variable (which always includes the origin); also returns it"""
+        minBounds = np.zeros(3)
+        maxBounds = np.zeros(3)
+
+        if len(self.vertPositions) > 0:
+            minBounds = np.minimum(self.vertPositions.min(axis=0), 0.0)
+            maxBounds = np.maximum(self.vertPositions.max(axis=0), 0.0)
+
+        self.bounds = { 'max' : maxBounds.tolist(), 'min' : minBounds.tolist() }
+
+        return self.bounds
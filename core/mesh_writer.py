@@ -0,0 +1,283 @@
+import os
+import traceback
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from . import writer_utils
+from . import export_cache
+
+#streams written in each vertex line, in order, by each vertex declaration
+VERTEX_DECLARATIONS = {
+    #with extra UV and qtangents (used by ped.sps shader)
+    'S12D0183F': ("vertPositions", "boneWeights", "boneIndexes", "vertNormals", "vColor", "vColor2", "uvCoords", "uvCoords2", "qtangents"),
+    #with qtangents (used by ped_hair_cutout_alpha.sps)
+    'SD7D22350': ("vertPositions", "boneWeights", "boneIndexes", "vertNormals", "vColor", "vColor2", "uvCoords", "qtangents"),
+    #no extra stuff, doesn't seem to support normal mapping etc (used by ped_default.sps)
+    'SBED48839': ("vertPositions", "boneWeights", "boneIndexes", "vertNormals", "vColor", "vColor2", "uvCoords"),
+}
+
+#format of each value of a stream in the vertex lines
+STREAM_VALUE_FORMATS = {
+    "vertPositions": "%.8f",
+    "boneWeights": "%.8f",
+    "boneIndexes": "%d",
+    "vertNormals": "%.8f",
+    "vColor": "%d",
+    "vColor2": "%d",
+    "uvCoords": "%.8f",
+    "uvCoords2": "%.8f",
+    "qtangents": "%.8f",
+}
+
+#number of values of each stream, used when a geometry doesn't have the stream
+STREAM_WIDTHS = {
+    "vertPositions": 3,
+    "boneWeights": 4,
+    "boneIndexes": 4,
+    "vertNormals": 3,
+    "vColor": 4,
+    "vColor2": 4,
+    "uvCoords": 2,
+    "uvCoords2": 2,
+    "qtangents": 4,
+}
+
+INDICES_PER_LINE = 15
+
+
+def write_mesh_file(filepath, geometryDatas, vertDeclarationType, startingShaderIndex = 0, isRigged = False, boneCount = 0, useExportCache = False):
+    """formats the geometries as a .mesh file, streaming it to filepath (which is only replaced once the file is complete).
+    With useExportCache, the file isn't written again if nothing changed since the last export,
+    and the Geometry blocks that didn't change are copied from it instead of formatted again.
+    Returns False if the file was skipped"""
+    geometryBlocks = [None] * len(geometryDatas)
+
+    if useExportCache:
+        headerKey = export_cache.get_header_key(geometryDatas, vertDeclarationType, startingShaderIndex, isRigged, boneCount)
+        geometryKeys = [export_cache.get_geometry_key(geom, vertDeclarationType, startingShaderIndex) for geom in geometryDatas]
+        manifest = export_cache.load_manifest(filepath)
+
+        if manifest is not None:
+            if manifest.headerKey == headerKey and manifest.geometryKeys == geometryKeys:
+                print("{} is unchanged since the last export, skipping it".format(filepath))
+                return False
+
+            cachedBlocks = manifest.read_geometry_blocks(filepath, geometryKeys)
+            geometryBlocks = [cachedBlocks.get(geometryKey) for geometryKey in geometryKeys]
+
+    #the old manifest doesn't describe the new file
+    export_cache.remove_manifest(filepath)
+
+    geometrySpans = []
+
+    with writer_utils.open_file_for_atomic_write(filepath) as outputFile:
+        fileBuilder = writer_utils.OpenFormatsFileComposer(outputFile)
+        compose_mesh_file(geometryDatas, vertDeclarationType, startingShaderIndex, isRigged, boneCount, fileBuilder, geometryBlocks, geometrySpans)
+
+    if useExportCache:
+        export_cache.save_manifest(filepath, headerKey, geometryKeys, geometrySpans)
+
+    return True
+
+
+class MeshWriteJob():
+    """the data needed for writing a .mesh file, gathered beforehand so that the writing can happen in another process"""
+    def __init__(self, name, filepath, geometryDatas, vertDeclarationType, startingShaderIndex = 0, isRigged = False, boneCount = 0, useExportCache = False):
+        self.name = name
+        self.filepath = filepath
+        self.geometryDatas = geometryDatas
+        self.vertDeclarationType = vertDeclarationType
+        self.startingShaderIndex = startingShaderIndex
+        self.isRigged = isRigged
+        self.boneCount = boneCount
+        self.useExportCache = useExportCache
+
+
+def run_mesh_write_job(writeJob):
+    """writes the job's .mesh file; returns False if it was skipped because nothing changed"""
+    return write_mesh_file(writeJob.filepath, writeJob.geometryDatas, writeJob.vertDeclarationType,
+                           writeJob.startingShaderIndex, writeJob.isRigged, writeJob.boneCount, writeJob.useExportCache)
+
+
+def write_mesh_files(writeJobs, workerCount = 0):
+    """writes the .mesh file of each MeshWriteJob, using a pool of workerCount processes (or one per CPU if it's 0).
+    Returns a list with a (status, error message) tuple for each job, in the same order.
+    The status is "exported", "skipped" (nothing changed since the last export) or "failed", and the error message is None unless it failed"""
+    if workerCount <= 0:
+        workerCount = os.cpu_count() or 1
+
+    workerCount = min(workerCount, len(writeJobs))
+
+    if workerCount > 1:
+        try:
+            #spawned processes only import the core package, so they work without Blender's modules
+            with ProcessPoolExecutor(workerCount, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(run_mesh_write_job, writeJob) for writeJob in writeJobs]
+                jobOutcomes = []
+
+                for future in futures:
+                    jobException = future.exception()
+                    jobOutcomes.append((future.result() if jobException is None else None, jobException))
+        except Exception as e:
+            print("Parallel writing failed, writing the files one by one instead! {}.{}".format(e, traceback.format_exc()))
+            jobOutcomes = [(None, BrokenExecutor())] * len(writeJobs)
+    else:
+        jobOutcomes = [(None, BrokenExecutor())] * len(writeJobs)
+
+    writeResults = []
+
+    #jobs that couldn't run in the pool are written here instead
+    for writeJob, (wasWritten, jobException) in zip(writeJobs, jobOutcomes):
+        if isinstance(jobException, BrokenExecutor):
+            try:
+                wasWritten = run_mesh_write_job(writeJob)
+                jobException = None
+            except Exception as e:
+                jobException = e
+
+        writeResults.append(get_job_result(wasWritten, jobException))
+
+    return writeResults
+
+
+def get_job_result(wasWritten, exception):
+    """returns the (status, error message) reported for a job that returned wasWritten or raised the exception"""
+    if exception is not None:
+        return ("failed", "{}: {}".format(type(exception).__name__, exception))
+
+    return ("exported" if wasWritten else "skipped", None)
+
+
+def compose_mesh_file(geometryDatas, vertDeclarationType, startingShaderIndex = 0, isRigged = False, boneCount = 0, fileBuilder = None,
+                      geometryBlocks = None, geometrySpans = None):
+    """writes the whole .mesh file's content to the fileBuilder and returns it.
+    If no fileBuilder is provided, a new one keeping the content in memory is used.
+    geometryBlocks may list an already formatted Geometry block (or None) for each geometry,
+    and geometrySpans, if provided, is filled with the position of each Geometry block in the output file"""
+    if fileBuilder is None:
+        fileBuilder = writer_utils.OpenFormatsFileComposer()
+
+    fileBuilder.writeLine("Version 165 32")
+    fileBuilder.openBracket()
+
+    fileBuilder.writeLine("Locked False")
+    fileBuilder.writeLine("Skinned {}".format(isRigged))
+    fileBuilder.writeLine("BoneCount {}".format(boneCount))
+    fileBuilder.writeLine("Mask 255") #I haven't seen another value being used here
+
+    parse_geometryDatas(geometryDatas, fileBuilder, vertDeclarationType, startingShaderIndex, geometryBlocks, geometrySpans)
+
+    fileBuilder.closeBracket()
+
+    return fileBuilder
+
+
+def parse_iterableFloatData(iterable):
+    """utility method for writing vectors and lists, limiting the precision of floats"""
+    return " ".join(["{:.8f}".format(numvar) for numvar in iterable])
+
+
+def parse_geometryDatas(geometryDatas, fileBuilder, vertexDeclarationType, startingShaderIndex=0, geometryBlocks=None, geometrySpans=None):
+    """adds formatted Bounds and Geometry data to the fileBuilder"""
+    if geometryBlocks is None:
+        geometryBlocks = [None] * len(geometryDatas)
+
+    fileBuilder.writeLine("Bounds")
+    fileBuilder.openBracket()
+
+    for geom in geometryDatas:
+        fileBuilder.writeLine("Aabb")
+        fileBuilder.openBracket()
+
+        fileBuilder.writeLine(" ".join(["Min", parse_iterableFloatData(geom.bounds["min"])]))
+        fileBuilder.writeLine(" ".join(["Max", parse_iterableFloatData(geom.bounds["max"])]))
+
+        fileBuilder.closeBracket()
+
+    fileBuilder.closeBracket()
+
+    fileBuilder.writeLine("Geometries")
+    fileBuilder.openBracket()
+
+    for geom, geometryBlock in zip(geometryDatas, geometryBlocks):
+        blockStart = fileBuilder.tell() if geometrySpans is not None else None
+
+        if geometryBlock is not None:
+            fileBuilder.writeRaw(geometryBlock)
+        else:
+            write_geometry_block(geom, fileBuilder, vertexDeclarationType, startingShaderIndex)
+
+        if geometrySpans is not None:
+            geometrySpans.append((blockStart, fileBuilder.tell()))
+
+    fileBuilder.closeBracket()
+
+
+def write_geometry_block(geom, fileBuilder, vertexDeclarationType, startingShaderIndex=0):
+    """adds the formatted Geometry block of the geometry to the fileBuilder"""
+    fileBuilder.writeLine("Geometry")
+    fileBuilder.openBracket()
+
+    fileBuilder.writeLine("ShaderIndex {}".format(startingShaderIndex + geom.shaderIndex))
+    fileBuilder.writeLine("Flags -") #not sure what else could go here
+    #this declaration seems to define which parameters must be provided for each vertex (see VERTEX_DECLARATIONS)
+    fileBuilder.writeLine("VertexDeclaration {}".format(vertexDeclarationType)) 
+
+    fileBuilder.writeLine("Indices {}".format(len(geom.indices)))
+    fileBuilder.openBracket()
+
+    fileBuilder.writeLines(format_index_lines(geom.indices))
+
+    fileBuilder.closeBracket()
+
+    fileBuilder.writeLine("Vertices {}".format(len(geom.vertPositions)))
+    fileBuilder.openBracket()
+
+    fileBuilder.writeLines(format_vertex_lines(geom, vertexDeclarationType))
+
+    fileBuilder.closeBracket()
+
+    fileBuilder.closeBracket()
+
+
+def format_index_lines(indices):
+    """returns the index list's lines, with a line break every INDICES_PER_LINE indices"""
+    indices = np.asarray(indices).tolist()
+    fullLineCount = len(indices) // INDICES_PER_LINE
+    lineFormat = " ".join(["%d"] * INDICES_PER_LINE)
+
+    lines = [lineFormat % tuple(indices[i:i + INDICES_PER_LINE]) for i in range(0, fullLineCount * INDICES_PER_LINE, INDICES_PER_LINE)]
+
+    if len(indices) > fullLineCount * INDICES_PER_LINE:
+        lines.append(" ".join(map(str, indices[fullLineCount * INDICES_PER_LINE:])))
+
+    return lines
+
+
+def format_vertex_lines(geom, vertDeclaration):
+    """returns one line per vertex, with the streams listed for the vertex declaration separated by ' / '"""
+    if vertDeclaration not in VERTEX_DECLARATIONS:
+        raise ValueError("unknown vertex declaration: {}".format(vertDeclaration))
+
+    vertCount = len(geom.vertPositions)
+    columns = []
+    entryFormats = []
+
+    for streamName in VERTEX_DECLARATIONS[vertDeclaration]:
+        columns.append(get_stream_values(geom, streamName, vertCount))
+        entryFormats.append(" ".join([STREAM_VALUE_FORMATS[streamName]] * STREAM_WIDTHS[streamName]))
+
+    lineFormat = " / ".join(entryFormats)
+
+    return [lineFormat % tuple(vertValues) for vertValues in np.hstack(columns).tolist()]
+
+
+def get_stream_values(geom, streamName, vertCount):
+    """returns an (vertCount, width) float64 array with the values of the geometry's stream, as they should be written.
+    Streams the geometry doesn't have (like the second uvs, which aren't always used) are written as zeros"""
+    values = np.asarray(getattr(geom, streamName), dtype=np.float64)
+
+    if len(values) == 0:
+        return np.zeros((vertCount, STREAM_WIDTHS[streamName]))
+
+    return values.reshape(vertCount, STREAM_WIDTHS[streamName])
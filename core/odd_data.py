@@ -0,0 +1,52 @@
+import os.path
+import traceback
+from . import reader_utils
+from . import odr_data
+
+
+def read_odd_file(filepath):
+    """returns an ODDData with the info gathered from the .odd file and the .odr files it references, or None if reading fails"""
+    filename = os.path.splitext(os.path.basename(filepath))[0]
+
+    try:
+        rootBlock = reader_utils.parse_openformats_file(filepath)
+    except Exception as e:
+        print("ODD file parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    return blocks_to_odd(rootBlock, filename, filepath)
+
+
+def blocks_to_odd(rootBlock, oddName, oddPath):
+    """returns an ODDData with the info gathered from the file"""
+    oddData = ODDData()
+    oddData.path = oddPath
+
+    oddDir = os.path.dirname(oddData.path)
+
+    for block in rootBlock.walk():
+        oddData = parse_block(block, oddData, oddDir)
+
+    print("done reading ODD data from file {}".format(oddName))
+
+    return oddData
+
+
+def parse_block(block, oddData, oddDir):
+    """just checks if the entry is a path with an ODR extension and then reads that ODR file if it is"""
+    lineData = block.get_line_text()
+    if lineData.lower().endswith(".odr"):
+        odrPath = os.path.join(oddDir, lineData)
+        odrData = odr_data.read_odr_file(odrPath)
+        if odrData is not None:
+            oddData.odrDatas.append(odrData)
+        else:
+            print("Failed import from odr in path {}".format(lineData))
+    
+    return oddData
+
+
+class ODDData:
+    def __init__(self):
+        self.path = None
+        self.odrDatas = []
@@ -0,0 +1,110 @@
+import os.path
+import traceback
+from . import reader_utils
+
+
+def read_odr_file(filepath):
+    """returns an ODRData with the info gathered from the .odr file, or None if reading fails"""
+    filename = os.path.splitext(os.path.basename(filepath))[0]
+
+    try:
+        rootBlock = reader_utils.parse_openformats_file(filepath)
+    except Exception as e:
+        print("ODR file parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    return blocks_to_odr(rootBlock, filename, filepath)
+
+
+def blocks_to_odr(rootBlock, odrName, odrPath):
+    """returns an ODRData with the info gathered from the file"""
+    odrData = ODRData()
+    odrData.path = odrPath
+
+    for block in rootBlock.walk():
+        check_relevant_section_start(block, odrData)
+
+    print("done reading ODR data from file {}".format(odrName))
+
+    return odrData
+
+def check_relevant_section_start(block, odrData):
+    """checks the block's keyword for names of sections of interest, like Shaders"""
+    if block.keyword == "Shaders":
+        parse_shaders(block, odrData)
+    elif block.keyword == "Skeleton":
+        parse_skeleton(block, odrData)
+    elif block.keyword == "LodGroup":
+        parse_lodgroups(block, odrData)
+
+
+def parse_lodgroups(block, odrData):
+    print("parsing lodmodels...")
+    for lodBlock in block.children:
+        if lodBlock.keyword in ("High", "Med", "Low", "Vlow"):
+            parse_lodmodel_data(lodBlock, odrData)
+
+
+def parse_lodmodel_data(lodBlock, odrData):
+    #if the "model category" (high, med etc) entry isn't followed by curly braces,
+    #we probably don't have a model declared for this LOD level
+    if len(lodBlock.children) > 0:
+        meshPath = lodBlock.children[0].keyword
+        if meshPath != "null":
+            odrPath = os.path.dirname(odrData.path)
+            meshPath = os.path.join(odrPath, meshPath)
+            odrData.meshPaths.append(meshPath)
+            print("reference to mesh at {}".format(meshPath))
+        
+
+def parse_skeleton(block, odrData):
+    #if not null, a relative path to the skel file is declared
+    skelPath = block.args[0]
+    if skelPath != "null":
+        odrPath = os.path.dirname(odrData.path)
+        odrData.skeletonFilePath = os.path.join(odrPath, skelPath)
+        print("got skeleton at {}".format(odrData.skeletonFilePath))
+
+def parse_shaders(block, odrData):
+    for shaderBlock in block.children:
+        if ".sps" in shaderBlock.keyword:
+            odrData.shaders.append(parse_shader_data(shaderBlock, odrData))
+
+
+def parse_shader_data(shaderBlock, odrData):
+    shader = ODRShader()
+    #the block's keyword is the "shader type"
+    shader.shaderType = shaderBlock.keyword.split(".")[0]
+    print("parsing shader {}".format(shader.shaderType))
+    for entry in shaderBlock.children:
+        if entry.keyword == "DiffuseSampler":
+            shader.diffuseSampler = entry.args[0]
+        elif entry.keyword == "BumpSampler":
+            samplerName = entry.args[0]
+            if samplerName != "*NULL*" and samplerName != "dummy_normal":
+                shader.bumpSampler = samplerName
+        elif entry.keyword == "SpecSampler":
+            samplerName = entry.args[0]
+            if samplerName != "*NULL*" and samplerName != "dummy_spec":
+                shader.specSampler = samplerName
+        elif entry.keyword == "Bumpiness":
+            shader.bumpiness = float(entry.args[0])
+
+    return shader
+
+
+class ODRData:
+    def __init__(self):
+        self.path = None
+        self.shaders = []
+        self.skeletonFilePath = None
+        self.meshPaths = []
+
+
+class ODRShader:
+    def __init__(self):
+        self.shaderType = None
+        self.diffuseSampler = None
+        self.bumpSampler = None
+        self.specSampler = None
+        self.bumpiness = 1.0
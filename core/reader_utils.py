@@ -0,0 +1,114 @@
+import codecs
+
+#blocks with these keywords contain lines of numbers instead of other blocks.
+#Their contents aren't tokenized; the parser only stores where they are in the data
+RAW_BODY_KEYWORDS = ("Vertices", "Indices")
+
+
+def parse_openformats_file(filepath, rawBodyKeywords = RAW_BODY_KEYWORDS):
+    """reads the whole file as bytes and returns its root OpenFormatsBlock"""
+    with open(filepath, 'rb') as reader:
+        data = reader.read()
+
+    return parse_openformats_data(data, rawBodyKeywords)
+
+
+def parse_openformats_data(data, rawBodyKeywords = RAW_BODY_KEYWORDS):
+    """builds a tree of OpenFormatsBlocks from openFormats-style text (as bytes), going through it only once.
+    Returns a root block (with no keyword) whose children are the file's top-level entries"""
+    rootBlock = OpenFormatsBlock(None, [], 0)
+    openBlocks = [rootBlock]
+    lastBlock = None
+
+    dataLength = len(data)
+    pos = len(codecs.BOM_UTF8) if data[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8 else 0
+
+    while pos < dataLength:
+        lineStart = pos
+        lineEnd = data.find(b"\n", pos)
+
+        if lineEnd == -1:
+            lineEnd = dataLength
+
+        pos = lineEnd + 1
+        line = data[lineStart:lineEnd].strip()
+
+        if not line:
+            continue
+
+        if line == b"{":
+            if lastBlock is None:
+                raise ValueError("found a '{{' not preceded by an entry at byte {}".format(lineStart))
+
+            if lastBlock.keyword in rawBodyKeywords:
+                #skip straight to the closing bracket; these blocks don't have any nested brackets
+                bodyEnd = data.find(b"}", pos)
+
+                if bodyEnd == -1:
+                    raise ValueError("'{}' block starting at byte {} is never closed".format(lastBlock.keyword, lineStart))
+
+                lastBlock.rawSource = data
+                lastBlock.rawSpan = (pos, bodyEnd)
+
+                pos = data.find(b"\n", bodyEnd)
+                pos = dataLength if pos == -1 else pos + 1
+            else:
+                openBlocks.append(lastBlock)
+
+            lastBlock = None
+        elif line == b"}":
+            if len(openBlocks) == 1:
+                raise ValueError("found an unmatched '}}' at byte {}".format(lineStart))
+
+            openBlocks.pop()
+            lastBlock = None
+        else:
+            tokens = line.decode('utf-8').split()
+            lastBlock = OpenFormatsBlock(tokens[0], tokens[1:], lineStart)
+            openBlocks[-1].children.append(lastBlock)
+
+    return rootBlock
+
+
+class OpenFormatsBlock():
+    """an entry of an openFormats file: a keyword, the arguments in the same line and,
+    if it is followed by brackets, the entries inside them"""
+    def __init__(self, keyword, args, offset):
+        self.keyword = keyword
+        self.args = args #list of strings
+        self.offset = offset #position of the entry's line in the file, in bytes
+        self.children = []
+        self.rawSource = None #the data the raw body is in, for blocks in RAW_BODY_KEYWORDS
+        self.rawSpan = None #(start, end) positions of the raw body in rawSource
+
+    def find_child(self, keyword):
+        """returns the first child entry with the keyword, or None if there isn't one"""
+        for child in self.children:
+            if child.keyword == keyword:
+                return child
+
+        return None
+
+    def find_children(self, keyword):
+        """returns all child entries with the keyword"""
+        return [child for child in self.children if child.keyword == keyword]
+
+    def walk(self):
+        """yields all entries below this one, in the order they appear in the file"""
+        pendingBlocks = list(reversed(self.children))
+
+        while len(pendingBlocks) > 0:
+            block = pendingBlocks.pop()
+            yield block
+            pendingBlocks.extend(reversed(block.children))
+
+    def get_line_text(self):
+        """returns the keyword and arguments joined back into a single line"""
+        return " ".join([self.keyword] + self.args)
+
+    def read_raw_text(self):
+        """returns the unparsed contents of this block's brackets, or an empty string if there aren't any"""
+        if self.rawSpan is None:
+            return ""
+
+        return self.rawSource[self.rawSpan[0]:self.rawSpan[1]].decode('utf-8')
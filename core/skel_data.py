@@ -0,0 +1,170 @@
+import traceback
+import numpy as np
+from . import reader_utils
+
+
+def read_skel_file(filepath, importCache = None):
+    """returns a SkeletonData with the data of all bones in the .skel file, or None if reading fails.
+    If an ImportCache is provided, it is checked before parsing and filled after it"""
+    with open(filepath, 'rb') as reader:
+        fileContent = reader.read()
+
+    if importCache is not None:
+        cachedArrays = importCache.load(filepath, fileContent, "skel")
+
+        if cachedArrays is not None:
+            print("Using cached data for skeleton {}".format(filepath))
+            return arrays_to_skeleton(cachedArrays)
+
+    try:
+        rootBlock = reader_utils.parse_openformats_data(fileContent)
+    except Exception as e:
+        print("Skeleton file parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    skeletonData = blocks_to_skeleton(rootBlock)
+
+    if skeletonData is not None and importCache is not None:
+        importCache.store(filepath, fileContent, "skel", skeleton_to_arrays(skeletonData))
+
+    return skeletonData
+
+
+def blocks_to_skeleton(rootBlock):
+    """returns a SkeletonData with the data of all bones in the file (parents always come before their children),
+    or None if reading fails or the number of bones found isn't the one declared in the file"""
+    #the skel file must have a "Version" header
+    versionBlock = rootBlock.find_child("Version")
+
+    if versionBlock is None:
+        return
+
+    print("Version OK")
+
+    #store the number of bones declared in the file
+    #so that we may know if we succeeded in importing all of them
+    numBonesBlock = versionBlock.find_child("NumBones")
+
+    if numBonesBlock is None:
+        return
+
+    try:
+        boneCount = int(numBonesBlock.args[0])
+    except (ValueError, IndexError) as e:
+        print("Bone parsing failed! Invalid NumBones entry: {}".format(e))
+        return
+
+    print("Bone count declared in file: {}".format(boneCount))
+
+    #get the first (root) bone
+    rootBoneBlock = versionBlock.find_child("Bone")
+
+    if rootBoneBlock is None:
+        return
+
+    print("Reading Bones...")
+
+    try:
+        boneBlocks, parentIndexes = flatten_bone_blocks(rootBoneBlock)
+    except Exception as e:
+        print("Bone parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    if len(boneBlocks) != boneCount:
+        print("Bone parsing failed! The file declares {} bones, but {} were found".format(boneCount, len(boneBlocks)))
+        return
+
+    skeletonData = SkeletonData(boneCount)
+    skeletonData.parentIndexes[:] = parentIndexes
+
+    try:
+        for boneIndex, boneBlock in enumerate(boneBlocks):
+            parse_bone_block(boneBlock, boneIndex, skeletonData)
+    except Exception as e:
+        print("Bone parsing failed! {}.{}".format(e, traceback.format_exc()))
+        return
+
+    return skeletonData
+
+
+def flatten_bone_blocks(rootBoneBlock):
+    """returns a list with the root Bone block and all Bone blocks inside its Children, with parents always before their children
+    (in the order they appear in the file), and a list with the index of each bone's parent in it (-1 for the root bone)"""
+    boneBlocks = []
+    parentIndexes = []
+    pendingBones = [(rootBoneBlock, -1)]
+
+    while len(pendingBones) > 0:
+        boneBlock, parentIndex = pendingBones.pop()
+        boneIndex = len(boneBlocks)
+        boneBlocks.append(boneBlock)
+        parentIndexes.append(parentIndex)
+
+        childrenBlock = boneBlock.find_child("Children")
+
+        if childrenBlock is not None:
+            #children are added in reverse, so that they come out of the stack in file order
+            for childBoneBlock in reversed(childrenBlock.find_children("Bone")):
+                pendingBones.append((childBoneBlock, boneIndex))
+
+    return boneBlocks, parentIndexes
+
+
+def parse_bone_block(boneBlock, boneIndex, skeletonData):
+    """stores the Bone block's name and entries as the bone at boneIndex of the SkeletonData"""
+    skeletonData.names[boneIndex] = boneBlock.args[0]
+
+    for entry in boneBlock.children:
+        if entry.keyword == "RotationQuaternion":
+            skeletonData.rotationQuats[boneIndex] = [float(arg) for arg in entry.args]
+
+        elif entry.keyword == "LocalOffset":
+            skeletonData.locations[boneIndex] = [float(arg) for arg in entry.args]
+
+        elif entry.keyword == "Scale":
+            skeletonData.scales[boneIndex] = [float(arg) for arg in entry.args]
+
+        elif entry.keyword == "Flags":
+            skeletonData.flags[boneIndex] = " ".join(entry.args)
+
+
+def skeleton_to_arrays(skeletonData):
+    """returns a dict with the SkeletonData's arrays, for storing in the import cache"""
+    return {
+        "names": np.array(skeletonData.names, dtype=str),
+        "parentIndexes": skeletonData.parentIndexes,
+        "locations": skeletonData.locations,
+        "rotationQuats": skeletonData.rotationQuats,
+        "scales": skeletonData.scales,
+        "flags": np.array(skeletonData.flags, dtype=str),
+    }
+
+
+def arrays_to_skeleton(arrays):
+    """returns a SkeletonData from a dict made by skeleton_to_arrays"""
+    skeletonData = SkeletonData(len(arrays["names"]))
+    skeletonData.names = [str(boneName) for boneName in arrays["names"]]
+    skeletonData.parentIndexes = arrays["parentIndexes"]
+    skeletonData.locations = arrays["locations"]
+    skeletonData.rotationQuats = arrays["rotationQuats"]
+    skeletonData.scales = arrays["scales"]
+    skeletonData.flags = [str(boneFlags) for boneFlags in arrays["flags"]]
+
+    return skeletonData
+
+
+class SkeletonData():
+    """the bones of a .skel file, stored as flat lists and arrays with one entry per bone.
+    Parents always come before their children"""
+    __slots__ = ("names", "parentIndexes", "locations", "rotationQuats", "scales", "flags")
+
+    def __init__(self, boneCount = 0):
+        self.names = [""] * boneCount
+        self.parentIndexes = np.full(boneCount, -1, dtype=np.int32) #index of each bone's parent; -1 for the root bone
+        self.locations = np.zeros((boneCount, 3)) #(x, y, z) offset from the parent bone, in its local space
+        self.rotationQuats = np.tile(np.array([0.0, 0.0, 0.0, 1.0]), (boneCount, 1)) #(x, y, z, w), in the order it is stored in the file
+        self.scales = np.ones((boneCount, 3)) #(x, y, z)
+        self.flags = [""] * boneCount #the bone's Flags entry, as written in the file
+
+    def bone_count(self):
+        return len(self.names)
@@ -0,0 +1,61 @@
+import os
+from contextlib import contextmanager
+
+
+class OpenFormatsFileComposer():
+    """a helper class for writing OpenFormats-style ped files.
+    Lines are written to the output file object, if one is provided, or kept in memory otherwise"""
+    def __init__(self, outputFile = None):
+        self.tabulationLevel = 0
+        self.chunks = []
+        self.outputFile = outputFile
+        self.writeText = outputFile.write if outputFile is not None else self.chunks.append
+
+    @property
+    def textContent(self):
+        """all the content written so far (only available when there's no output file)"""
+        return "".join(self.chunks)
+
+    def writeLine(self, lineContent):
+        """writes content ending with \\n, properly considering the current tabulationLevel"""
+        self.writeText("".join([("\t" * self.tabulationLevel), lineContent, "\n"]))
+
+    def writeLines(self, linesContent):
+        """writes each of the lines ending with \\n, properly considering the current tabulationLevel"""
+        indentation = "\t" * self.tabulationLevel
+        self.writeText("".join([indentation + lineContent + "\n" for lineContent in linesContent]))
+
+    def writeRaw(self, content):
+        """writes the content as it is, without tabulation or line breaks"""
+        self.writeText(content)
+
+    def tell(self):
+        """returns the current position in the output file, in bytes"""
+        return self.outputFile.tell()
+
+    def openBracket(self):
+        """writes a line with a single opening bracket, then increments the current tabulation level"""
+        self.writeLine("{")
+        self.tabulationLevel += 1
+
+    def closeBracket(self):
+        """decrements the current tabulation level, then writes a line with a single closing bracket"""
+        self.tabulationLevel -= 1
+        self.writeLine("}")
+
+
+@contextmanager
+def open_file_for_atomic_write(filepath):
+    """yields a text file object writing to a temporary file next to filepath.
+    The temporary file replaces the one at filepath when the block ends, or is deleted if the block raises an exception"""
+    tempPath = "{}.{}.tmp".format(filepath, os.getpid())
+
+    try:
+        with open(tempPath, 'w', encoding='utf-8', buffering=1024 * 1024) as tempFile:
+            yield tempFile
+
+        os.replace(tempPath, filepath)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
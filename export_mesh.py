@@ -3,221 +3,114 @@ import os.path
 import traceback
 import bmesh
 from mathutils import *
-from . import reader_utils
-from . import mesh_geometry_utils as geomutils
+from .core import mesh_writer
 from . import mesh_geometry_datagather_utils as geomreader
-from . import writer_utils
 
 
-def export_procedure_start(context, filepath, vertDeclarationType, startingShaderIndex=0, exportAllSelected=False):
+def export_procedure_start(context, filepath, vertDeclarationType, startingShaderIndex=0, exportAllSelected=False, applyModifiers=False, weightPruneThreshold=0.0, normalWeldDistance=0.0, workerCount=0, useExportCache=False):
+    """exports the active object, or all selected ones to the filepath's directory.
+    Returns a list of (object name, status, error message or None) for the exported objects, with the statuses of write_mesh_files"""
     if exportAllSelected:
         if len(context.selected_objects) > 0:
             targetDir = os.path.dirname(filepath)
-            for obj in context.selected_objects:
-                destPath = os.path.join(targetDir, obj.name + ".mesh")
-                export_target_object(obj, destPath, vertDeclarationType, startingShaderIndex)
+            return export_all_objects(context.selected_objects, targetDir, vertDeclarationType, startingShaderIndex, applyModifiers, weightPruneThreshold, normalWeldDistance, workerCount, useExportCache)
         else:
             print("No objects selected, aborting")
+            return []
     else:
-        export_target_object(context.active_object, filepath, vertDeclarationType, startingShaderIndex)
+        return [export_target_object(context.active_object, filepath, vertDeclarationType, startingShaderIndex, applyModifiers, weightPruneThreshold, normalWeldDistance, useExportCache)]
 
 
-def export_target_object(targetObj, filepath, vertDeclarationType, startingShaderIndex=0):
-    print("export to GTA5 .mesh: begin")
+def export_all_objects(targetObjs, targetDir, vertDeclarationType, startingShaderIndex=0, applyModifiers=False, weightPruneThreshold=0.0, normalWeldDistance=0.0, workerCount=0, useExportCache=False):
+    """exports each object to a .mesh file named after it in targetDir.
+    The objects' data is gathered here, then the files are formatted and written by a pool of workerCount processes.
+    Returns a list of (object name, status, error message or None)"""
+    exportResults = []
+    writeJobs = []
 
-    if targetObj is None:
-        print("export to GTA5 .mesh: no active object, aborting")
-        return
+    for obj in targetObjs:
+        #other selected objects, like the meshes' armature, are left out
+        if obj.type != "MESH":
+            continue
 
-    print("target mesh: {}".format(targetObj.name))
+        destPath = os.path.join(targetDir, obj.name + ".mesh")
 
-    if targetObj.type != "MESH":
-        print("export to GTA5 .mesh: active object is not a mesh, aborting")
-        return
+        try:
+            writeJob = gather_export_job(obj, destPath, vertDeclarationType, startingShaderIndex, applyModifiers, weightPruneThreshold, normalWeldDistance, useExportCache)
+        except Exception as e:
+            print("export to GTA5 .mesh: data gathering failed! {}.{}".format(e, traceback.format_exc()))
+            exportResults.append((obj.name, "failed", "{}: {}".format(type(e).__name__, e)))
+            continue
 
-    #we expect to start the procedure while in object mode
-    #...but we only want to do it if something's active
-    bpy.context.view_layer.objects.active = targetObj
-    bpy.ops.object.mode_set( mode = 'OBJECT' )
+        writeJobs.append(writeJob)
 
-    parentSkel = targetObj.parent
-    isRigged = parentSkel is not None and parentSkel.type == "ARMATURE"
+    print("export to GTA5 .mesh: formatting and writing {} files to disk...".format(len(writeJobs)))
+    writeResults = mesh_writer.write_mesh_files(writeJobs, workerCount)
 
-    fileBuilder = writer_utils.OpenFormatsFileComposer()
-    fileBuilder.writeLine("Version 165 32")
-    fileBuilder.openBracket()
+    for writeJob, (writeStatus, writeError) in zip(writeJobs, writeResults):
+        exportResults.append((writeJob.name, writeStatus, writeError))
 
-    fileBuilder.writeLine("Locked False")
-    fileBuilder.writeLine("Skinned {}".format(isRigged))
+    for objName, exportStatus, exportError in exportResults:
+        print("export to GTA5 .mesh: {} - {}".format(objName, exportStatus if exportError is None else "failed ({})".format(exportError)))
 
-    if isRigged:
-        fileBuilder.writeLine("BoneCount {}".format(len(parentSkel.data.bones)))
-    else:
-        fileBuilder.writeLine("BoneCount 0")
+    return exportResults
 
-    fileBuilder.writeLine("Mask 255") #I haven't seen another value being used here
 
-    print("export to GTA5 .mesh: retrieving mesh data from object...")
-    #now we duplicate the target mesh, break it by materials and parse them into GeometryData objects
-    geometryDatas = geomreader.meshobj_to_geometries(targetObj, parentSkel)
+def export_target_object(targetObj, filepath, vertDeclarationType, startingShaderIndex=0, applyModifiers=False, weightPruneThreshold=0.0, normalWeldDistance=0.0, useExportCache=False):
+    """exports the object to filepath. Returns a tuple with the object's name, the status ("exported", "skipped" if nothing changed
+    since the last export, or "failed") and an error message (None if it didn't fail)"""
+    targetName = targetObj.name if targetObj is not None else None
+
+    try:
+        writeJob = gather_export_job(targetObj, filepath, vertDeclarationType, startingShaderIndex, applyModifiers, weightPruneThreshold, normalWeldDistance, useExportCache)
+
+        if writeJob is None:
+            return (targetName, "failed", "not a mesh")
 
-    print("export to GTA5 .mesh: parsing retrieved mesh data...")
-    parse_geometryDatas(geometryDatas, fileBuilder, vertDeclarationType, startingShaderIndex)
+        print("export to GTA5 .mesh: formatting and writing to disk...")
+        wasWritten = mesh_writer.run_mesh_write_job(writeJob)
+    except Exception as e:
+        print("export to GTA5 .mesh: export failed! {}.{}".format(e, traceback.format_exc()))
+        return (targetName, "failed", "{}: {}".format(type(e).__name__, e))
 
-    fileBuilder.closeBracket()
-    print("export to GTA5 .mesh: writing to disk...")
-    write_to_file(fileBuilder.textContent, filepath)
     print("export to GTA5 .mesh: end")
 
+    return (targetName, "exported" if wasWritten else "skipped", None)
+
+
+def gather_export_job(targetObj, filepath, vertDeclarationType, startingShaderIndex=0, applyModifiers=False, weightPruneThreshold=0.0, normalWeldDistance=0.0, useExportCache=False):
+    """reads the object's data and returns a MeshWriteJob for writing it to filepath, or None if the object can't be exported"""
+    print("export to GTA5 .mesh: begin")
+
+    if targetObj is None:
+        print("export to GTA5 .mesh: no active object, aborting")
+        return
+
+    print("target mesh: {}".format(targetObj.name))
 
-def parse_iterableData(iterable):
-    """utility method for writing vectors and lists"""
-    return " ".join(map(str, iterable))
+    if targetObj.type != "MESH":
+        print("export to GTA5 .mesh: active object is not a mesh, aborting")
+        return
 
-def parse_iterableFloatData(iterable):
-    """utility method for writing vectors and lists, limiting the precision of floats"""
-    return " ".join(["{:.8f}".format(numvar) for numvar in iterable])
+    #changes made in edit mode only reach the mesh data when it's synced
+    if targetObj.mode == 'EDIT':
+        targetObj.update_from_editmode()
 
-def parse_iterableIntData(iterable):
-    """utility method for writing vectors and lists, limiting the precision to integers"""
-    return " ".join(["{:.0f}".format(numvar) for numvar in iterable])
+    parentSkel = targetObj.parent
+    isRigged = parentSkel is not None and parentSkel.type == "ARMATURE"
 
+    print("export to GTA5 .mesh: retrieving mesh data from object...")
+    #now we read a copy of the target mesh, break it by materials and parse them into GeometryData objects.
+    #meshes parented to anything but an armature are exported without weights
+    geometryDatas = geomreader.meshobj_to_geometries(targetObj, parentSkel if isRigged else None, applyModifiers, weightPruneThreshold, normalWeldDistance)
+
+    boneCount = len(parentSkel.data.bones) if isRigged else 0
 
-def parse_geometryDatas(geometryDatas, fileBuilder, vertexDeclarationType, startingShaderIndex=0):
-    """adds formatted Bounds and Geometry data to the fileBuilder"""
-    fileBuilder.writeLine("Bounds")
-    fileBuilder.openBracket()
-
-    for geom in geometryDatas:
-        fileBuilder.writeLine("Aabb")
-        fileBuilder.openBracket()
-
-        fileBuilder.writeLine(" ".join(["Min", parse_iterableFloatData(geom.bounds["min"])]))
-        fileBuilder.writeLine(" ".join(["Max", parse_iterableFloatData(geom.bounds["max"])]))
-
-        fileBuilder.closeBracket()
-
-    fileBuilder.closeBracket()
-
-    fileBuilder.writeLine("Geometries")
-    fileBuilder.openBracket()
-
-    for geom in geometryDatas:
-        fileBuilder.writeLine("Geometry")
-        fileBuilder.openBracket()
-
-        fileBuilder.writeLine("ShaderIndex {}".format(startingShaderIndex + geom.shaderIndex))
-        fileBuilder.writeLine("Flags -") #not sure what else could go here
-        #this declaration seems to define which parameters must be provided for each vertex.
-        fileBuilder.writeLine("VertexDeclaration {}".format(vertexDeclarationType)) 
-        #S12D0183F -with extra UV and qtangents (used by ped.sps shader)
-        #SD7D22350 -with qtangents (used by ped_hair_cutout_alpha.sps)
-        #SBED48839 -no extra stuff, doesn't seem to support normal mapping etc (used by ped_default.sps)
-
-        fileBuilder.writeLine("Indices {}".format(len(geom.indices)))
-        fileBuilder.openBracket()
-
-        #there is a line break every 15 indices
-        writtenIndices = 0
-        while writtenIndices < len(geom.indices):
-            fileBuilder.writeLine(parse_iterableData(geom.indices[writtenIndices:min(writtenIndices + 15, len(geom.indices))]))
-            writtenIndices += 15
-
-        fileBuilder.closeBracket()
-
-        fileBuilder.writeLine("Vertices {}".format(len(geom.vertPositions)))
-        fileBuilder.openBracket()
-
-        write_verts_by_vertdeclaration(fileBuilder, geom, vertexDeclarationType)
-
-        fileBuilder.closeBracket()
-
-        fileBuilder.closeBracket()
-
-    fileBuilder.closeBracket()
-
-def adjust_bone_weights(weights):
-    """
-    GTA5 requires bone weights to be normalized and quantized in the 0-255 range. 
-    Otherwise it can happen that vertex positions become distorted. Especial for facial bones.
-    As weights are stored as floats in blender and the mesh file we have to adjust the float values
-    to be in sync with their integer counterpart.
-    """
-    wSum = sum(weights)
-    if wSum <= 0: return weights
-
-    # first normalize weights
-    # usually incoming weights are already normalised - but to be on the save side
-    Max = max(weights)
-    weights_normalised = [weight / wSum for weight in weights]
-
-    # convert to 0-255 range
-    weights_normalised_255 = [round(weight_normalised * 255) for weight_normalised in weights_normalised]
-
-    # fix normalisation by making sure the sum is always 255
-    wSum_255 = sum(weights_normalised_255)
-    wSumOffset = 255 - wSum_255
-    if wSumOffset != 0:
-        step = 1 if wSumOffset > 0 else -1
-        while wSumOffset != 0:
-            for idx in range(len(weights_normalised_255)):
-                if(weights_normalised_255[idx] > 0):
-                    weights_normalised_255[idx] += step
-                    wSumOffset -= step
-                if wSumOffset == 0: break
-
-    # convert back into 0-1 range
-    weights_adjusted = [weight_normalised_255 / 255 for weight_normalised_255 in weights_normalised_255]
-
-    return weights_adjusted
-
-def adjust_vertex_color(color):
-    return [int(colorvar*255) for colorvar in color]
-
-def write_verts_by_vertdeclaration(fileBuilder, geom, vertDeclaration):
-    if vertDeclaration == 'S12D0183F':
-        for i in range(len(geom.vertPositions)):
-            fileBuilder.writeLine(" / ".join([parse_iterableFloatData(geom.vertPositions[i]),
-                                                parse_iterableFloatData(adjust_bone_weights(geom.boneWeights[i])),
-                                                parse_iterableData(geom.boneIndexes[i]),
-                                                parse_iterableFloatData(geom.vertNormals[i]),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor[i])),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor2[i])),
-                                                parse_iterableFloatData(geom.uvCoords[i]),
-                                                parse_iterableFloatData(geom.uvCoords2[i]), #second UV map... not always used
-                                                parse_iterableFloatData(geom.qtangents[i])
-                                                ])) 
-    elif vertDeclaration == 'SD7D22350':
-        for i in range(len(geom.vertPositions)):
-            fileBuilder.writeLine(" / ".join([parse_iterableFloatData(geom.vertPositions[i]),
-                                                parse_iterableFloatData(adjust_bone_weights(geom.boneWeights[i])),
-                                                parse_iterableData(geom.boneIndexes[i]),
-                                                parse_iterableFloatData(geom.vertNormals[i]),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor[i])),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor2[i])),
-                                                parse_iterableFloatData(geom.uvCoords[i]),
-                                                parse_iterableFloatData(geom.qtangents[i])
-                                                ])) 
-    elif vertDeclaration == 'SBED48839':
-        for i in range(len(geom.vertPositions)):
-            fileBuilder.writeLine(" / ".join([parse_iterableFloatData(geom.vertPositions[i]),
-                                                parse_iterableFloatData(adjust_bone_weights(geom.boneWeights[i])),
-                                                parse_iterableData(geom.boneIndexes[i]),
-                                                parse_iterableFloatData(geom.vertNormals[i]),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor[i])),
-                                                parse_iterableIntData(adjust_vertex_color(geom.vColor2[i])),
-                                                parse_iterableFloatData(geom.uvCoords[i])
-                                                ])) 
-
-
-def write_to_file(content, filepath):
-    f = open(filepath, 'w', encoding='utf-8')
-    f.write(content)
-    f.close()
+    return mesh_writer.MeshWriteJob(targetObj.name, filepath, geometryDatas, vertDeclarationType, startingShaderIndex, isRigged, boneCount, useExportCache)
 
 
 from bpy_extras.io_utils import ExportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, FloatProperty
 from bpy.types import Operator
 
 class ExportGta5Mesh(Operator):
@@ -269,9 +162,60 @@ class ExportGta5Mesh(Operator):
         default=False,
     )
 
+    applyModifiers: BoolProperty(
+        name="Apply Modifiers",
+        description="Export the meshes with their modifiers applied, as they are displayed in the viewport",
+        default=False,
+    )
+
+    weightPruneThreshold: FloatProperty(
+        name="Weight Prune Threshold",
+        description="Bone weights below this value are left out before keeping the 4 biggest weights of each vertex",
+        default=0.0,
+        min=0.0,
+        max=1.0,
+    )
+
+    normalWeldDistance: FloatProperty(
+        name="Normal Weld Distance",
+        description="Vertices closer than this distance share their averaged normal, so that meshes already split at uv seams aren't shaded with visible seams. 0 keeps each vertex's own normal",
+        default=0.0,
+        min=0.0,
+        max=0.01,
+        precision=5,
+        subtype='DISTANCE',
+    )
+
+    useExportCache: BoolProperty(
+        name="Skip Unchanged Geometries",
+        description="Keep a manifest next to each exported file, so that files and geometries that didn't change since the last export aren't formatted again",
+        default=True,
+    )
+
+    exportWorkerCount: IntProperty(
+        name="Export Processes",
+        description="How many files are formatted and written at the same time when exporting all selected meshes. 0 uses one process per CPU",
+        default=0,
+        min=0,
+    )
+
 
     def execute(self, context):
-        export_procedure_start(context, self.filepath, self.vertDeclarationType, self.startingShaderIndex, self.exportAllSelected)
+        exportResults = export_procedure_start(context, self.filepath, self.vertDeclarationType, self.startingShaderIndex,
+                                               self.exportAllSelected, self.applyModifiers, self.weightPruneThreshold, self.normalWeldDistance, self.exportWorkerCount,
+                                               self.useExportCache)
+
+        failedNames = [objName for objName, exportStatus, _ in exportResults if exportStatus == "failed"]
+        skippedCount = sum(1 for _, exportStatus, _ in exportResults if exportStatus == "skipped")
+        exportedCount = sum(1 for _, exportStatus, _ in exportResults if exportStatus == "exported")
+
+        if len(failedNames) > 0:
+            self.report({'WARNING'}, "Failed to export: {}".format(", ".join(map(str, failedNames))))
+        elif skippedCount > 0:
+            self.report({'INFO'}, "Exported {} meshes, skipped {} unchanged ones".format(exportedCount, skippedCount))
+        else:
+            self.report({'INFO'}, "Exported {} meshes".format(exportedCount))
+
         return {'FINISHED'}
 
     def invoke(self, context, event):
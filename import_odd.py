@@ -2,7 +2,7 @@ import bpy
 import os.path
 import traceback
 from mathutils import *
-from . import reader_utils
+from .core import odd_data
 from . import import_odr
 from . import import_skel
 
@@ -10,70 +10,33 @@ from . import import_skel
 def import_odd_from_file(filepath, alsoApplyData = True):
     filename = os.path.splitext(os.path.basename(filepath))[0]
     print("Import GTAV ODD {} : begin".format(filename))
-    with open(filepath, 'r', encoding='utf-8') as reader:
-        oddData = string_to_odd(reader, filename, filepath)
+    oddData = odd_data.read_odd_file(filepath)
+
+    if oddData is None:
+        return
 
     if alsoApplyData:
         print("Applying data from read ODD file {}".format(filename))
-        oddData.apply_data()
+        apply_odd_data(oddData)
 
     return oddData
 
 
-def string_to_odd(reader, oddName, oddPath):
-    """returns an ODDData with the info gathered from the file"""
-    #keep reading until we reach an empty line (end of file)
-    line = reader.readline()
-    
-    oddData = ODDData()
-    oddData.path = oddPath
-
-    oddDir = os.path.dirname(oddData.path)
-
-    while line != '':
-        oddData = parse_line(reader, line, oddData, oddDir)
-        line = reader.readline()
-
-    print("done reading ODD data from file {}".format(oddName))
-
-    return oddData
+def apply_odd_data(oddData):
+    """imports all ODRs read from the ODD file. The first skeleton found is set as the override skeleton,
+    with whom any ODRs without a skel will be rigged"""
 
+    overrideSkel = None
+    overrideSkelPath = None
 
-def parse_line(reader, line, oddData, oddDir):
-    """just checks the line for an ODR extension and then attempts an import from it if the extension is found"""
-    if "odr" in line.lower():
-        lineData = line.strip()
-        odrPath = os.path.join(oddDir, lineData)
-        odrData = import_odr.import_odr_from_file(odrPath, False)
-        if odrData is not None:
-            oddData.odrDatas.append(odrData)
-        else:
-            print("Failed import from odr in path {}".format(lineData))
+    for odrData in oddData.odrDatas:
+        if odrData.skeletonFilePath is not None:
+            overrideSkel = import_skel.import_skel_from_file(odrData.skeletonFilePath)
+            overrideSkelPath = odrData.skeletonFilePath
+            break
     
-    return oddData
-
-
-class ODDData:
-    def __init__(self):
-        self.path = None
-        self.odrDatas = []
-
-    def apply_data(self):
-        """imports all ODRs read from the ODD file. The first skeleton found is set as the override skeleton,
-        with whom any ODRs without a skel will be rigged"""
-
-        overrideSkel = None
-        overrideSkelPath = None
-
-        for odrData in self.odrDatas:
-            if odrData.skeletonFilePath is not None:
-                overrideSkel = import_skel.import_skel_from_file(odrData.skeletonFilePath)
-                overrideSkelPath = odrData.skeletonFilePath
-                break
-        
-        for odrData in self.odrDatas:
-            odrData.apply_data(overrideSkel, overrideSkelPath)
-
+    for odrData in oddData.odrDatas:
+        import_odr.apply_odr_data(odrData, overrideSkel, overrideSkelPath)
 
 
 from bpy_extras.io_utils import ImportHelper
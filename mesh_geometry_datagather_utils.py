@@ -1,211 +1,222 @@
 import bpy
 import bmesh
+import numpy as np
 from mathutils import *
 from . import mesh_geometry_utils as geomutils
+from .core import mesh_data
 
 
-def meshobj_to_geometries(meshObj, parentSkeleton):
-    """returns a list of GeometryData objects, one per material, containing the meshObj's relevant data"""
-    #make sure there's only one selected object, because we're going to duplicate it
-    if len(bpy.context.selected_objects) > 0:
-        bpy.ops.object.select_all()
-    
-    meshObj.select_set(True)
-    #also make sure it's the active one
-    bpy.context.view_layer.objects.active = meshObj
+def meshobj_to_geometries(meshObj, parentSkeleton, applyModifiers = False, weightPruneThreshold = 0.0, normalWeldDistance = 0.0):
+    """returns a list of GeometryData objects, one per material, containing the meshObj's relevant data.
+    The data is read from a temporary copy of the object's mesh, so the object, the selection and the scene are left untouched.
+    If normalWeldDistance is above 0, vertices closer than it share their averaged normal"""
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    sourceObj = meshObj.evaluated_get(depsgraph) if applyModifiers else meshObj
 
-    #duplicating in these conditions should make the clone be the only one selected and active
-    bpy.ops.object.duplicate()
+    tempMesh = sourceObj.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph)
 
-    objCopy = bpy.context.active_object
+    try:
+        #normals are read before triangulating, so that the new faces don't affect them
+        vertNormals = read_mesh_array(tempMesh.vertices, "normal", np.float32, 3)
+        triangulate_mesh(tempMesh)
+        return parse_mesh_to_geometries(tempMesh, meshObj, parentSkeleton, vertNormals, weightPruneThreshold, normalWeldDistance)
+    finally:
+        sourceObj.to_mesh_clear()
 
-    bpy.ops.object.mode_set( mode = 'EDIT' )
 
-    #un-hide all verts
-    bpy.ops.mesh.reveal(select=False)
+def triangulate_mesh(mesh):
+    """triangulates all faces of the mesh (vertices are kept as they are)"""
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
 
-    #split edges by UV islands, because GTA seems to link all islands if their vertices are connected, messing up the map
-    bm = bmesh.from_edit_mesh(objCopy.data)
-    # old seams
-    seams = [e for e in bm.edges if e.seam]
-    # unmark
-    for e in seams:
-        e.seam = False
+    bmesh.ops.triangulate(bm, faces=bm.faces)
 
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.uv.select_all(action='SELECT')
-    # mark seams from uv islands
-    bpy.ops.uv.seams_from_islands()
-    seams = [e for e in bm.edges if e.seam]
+    bm.to_mesh(mesh)
+    bm.free()
 
-    #store verts from before splitting at the seams, because splitting changes the normals in an undesired way
-    correctedNormalsPositions = {}
-    for e in seams:
-        for vert in e.verts:
-            correctedNormalsPositions[vert.co.copy().freeze()] = vert.normal.copy()
 
-    # split on seams
-    bmesh.ops.split_edges(bm, edges=seams)
+def parse_mesh_to_geometries(theMesh, meshObj, parentSkeleton, vertNormals, weightPruneThreshold = 0.0, normalWeldDistance = 0.0):
+    """parses a triangulated mesh into one GeometryData object per material used by its faces"""
+    vertCount = len(theMesh.vertices)
 
-    #also triangulate the mesh
-    bmesh.ops.triangulate(bm, faces=bm.faces)
+    #vert positions (normals are provided)...
+    vertPositions = read_mesh_array(theMesh.vertices, "co", np.float32, 3)
 
-    bmesh.update_edit_mesh(objCopy.data)
+    #vertices already split at uv seams (like the ones of imported meshes) get the normal they'd have if they weren't split
+    if normalWeldDistance > 0.0:
+        vertNormals, weldedCount = mesh_data.weld_coincident_normals(vertPositions, vertNormals, normalWeldDistance)
+        print("{}: welded the normals of {} coincident vertices, {} vertices kept their own normals".format(meshObj.name, weldedCount, vertCount - weldedCount))
 
-    bm.free()
+    #weights...
+    boneIndexes, vertWeights = get_vertex_bone_weights(theMesh, meshObj, parentSkeleton, weightPruneThreshold)
 
-    #the vertex group limiting needs the target vertices to be selected
-    bpy.ops.mesh.select_all(action='SELECT')
+    #loop data: the triangles' loops, uvs, colors and tangents
+    loopVertIndices = read_mesh_array(theMesh.loops, "vertex_index", np.int32)
+    triangleLoops = read_mesh_array(theMesh.polygons, "loop_start", np.int32)[:, None] + np.arange(3, dtype=np.int32)
+    faceMaterials = read_mesh_array(theMesh.polygons, "material_index", np.int32)
 
-    #edit mode changes don't seem to take place until we change mode to object
-    bpy.ops.object.mode_set( mode = 'OBJECT' )
+    #store uv layers (always 1, but 2 if we find the second one)
+    loopUvs = [read_mesh_array(uvlayer.data, "uv", np.float32, 2) for uvlayer in theMesh.uv_layers[:2]]
 
-    #limit weights to 4 per vertex and normalize them
-    if(len(objCopy.vertex_groups) > 0):
-        bpy.ops.object.vertex_group_limit_total(group_select_mode='ALL', limit=4)
-        bpy.ops.object.vertex_group_normalize_all(group_select_mode='ALL', lock_active=False)
+    while len(loopUvs) < 2:
+        loopUvs.append(np.zeros((len(theMesh.loops), 2), dtype=np.float32))
 
-    #return to edit mode for the separation
-    bpy.ops.object.mode_set( mode = 'EDIT' )
+    #vertices are split wherever their loops don't share the same uvs, because GTA seems to link all islands
+    #if their vertices are connected, messing up the map
+    loopSplitKeys = get_loop_split_keys(loopVertIndices, loopUvs)
 
-    #we're going to select pieces by material, so deselect all verts first
-    bpy.ops.mesh.select_all(action='DESELECT')
+    # tangents and bitangents
+    loopTangents = get_loop_tangents(theMesh)
 
-    #separate and mark each object with its "shaderIndex"
-    #but keep the last piece in this object, so that we don't end up with an extra empty geometry
-    for i in range(len(objCopy.material_slots) - 1, 0, -1):
-        objCopy.active_material_index = i
-        objCopy["Gta5MatIndex"] = i
-        bpy.ops.object.material_slot_select()
-        bpy.ops.mesh.separate()
+    #vertex color layers (should be two but who knows what people are doing);
+    #meshes imported by this addon have their colors stored per vertex instead
+    loopColors = geomutils.get_color_attributes_data(theMesh, 'CORNER')
+    pointColors = geomutils.get_color_attributes_data(theMesh, 'POINT') if len(loopColors) == 0 else []
 
+    #colors are stored in the 0-255 range; the first channel is white by default
+    vertColors = [np.ones((vertCount, 4), dtype=np.float32), np.zeros((vertCount, 4), dtype=np.float32)]
 
-    objCopy["Gta5MatIndex"] = 0
+    for i, colors in enumerate(pointColors[:2]):
+        vertColors[i] = colors
 
-    #finally, back again to object mode
-    bpy.ops.object.mode_set( mode = 'OBJECT' )
-    
+    #faces with a material index above the object's material slots are exported with the last material
+    materialCount = max(len(meshObj.material_slots), 1)
+    faceMaterials = np.clip(faceMaterials, 0, materialCount - 1)
 
     resultingGeometries = []
 
-    #after separating, all pieces are selected
-    for obj in bpy.context.selected_objects:
-        resultingGeometries.append(parse_obj_to_geometrydata(obj, parentSkeleton, obj["Gta5MatIndex"], correctedNormalsPositions))
+    for shaderIndex in range(materialCount):
+        geomTriangleLoops = triangleLoops[faceMaterials == shaderIndex].ravel()
+
+        if len(geomTriangleLoops) == 0:
+            continue
+
+        #each unique (vertex, uv, uv2) used by the geometry's loops becomes a vertex, taking the per-loop data from its first loop
+        firstLoopPositions, geomIndices = mesh_data.get_unique_rows(loopSplitKeys[geomTriangleLoops])
+        vertLoops = geomTriangleLoops[firstLoopPositions]
+        geomVerts = loopVertIndices[vertLoops]
+
+        geom = mesh_data.GeometryData(len(geomVerts))
+        geom.shaderIndex = shaderIndex
+        geom.indices = geomIndices.astype(np.int32)
+        geom.vertPositions = vertPositions[geomVerts]
+        geom.vertNormals = vertNormals[geomVerts]
+        geom.boneIndexes = boneIndexes[geomVerts]
+        quantizedWeights, unweightedVerts = mesh_data.quantize_bone_weights(vertWeights[geomVerts])
+        #the file stores the quantized weights divided by 255
+        geom.boneWeights = quantizedWeights / 255
+
+        if parentSkeleton is not None and len(unweightedVerts) > 0:
+            print("WARNING: {} vertices of {} have no bone weights".format(len(unweightedVerts), meshObj.name))
+
+        #uvs are flipped in the y axis
+        geom.uvCoords = loopUvs[0][vertLoops]
+        geom.uvCoords[:, 1] *= -1
+        geom.uvCoords2 = loopUvs[1][vertLoops]
+        geom.uvCoords2[:, 1] *= -1
+
+        geom.qtangents = loopTangents[vertLoops]
+
+        geomColors = [colors[geomVerts] for colors in vertColors]
+
+        for i, colors in enumerate(loopColors[:2]):
+            geomColors[i] = colors[vertLoops]
+
+        #colors are truncated, not rounded, when converting to the 0-255 range
+        geom.vColor = np.clip(geomColors[0].astype(np.float64) * 255, 0, 255).astype(np.uint8)
+        geom.vColor2 = np.clip(geomColors[1].astype(np.float64) * 255, 0, 255).astype(np.uint8)
+
+        #finally, calculate and store bounds
+        geom.calculate_geometry_bounds()
 
-    #delete duplicates now
-    for obj in bpy.context.selected_objects:
-        geomutils.delete_mesh(obj.data)
+        resultingGeometries.append(geom)
 
     return resultingGeometries
 
 
-def parse_obj_to_geometrydata(meshObj, parentSkeleton, shaderIndex, correctedNormalsPositionsDict):
-    """parses a single-material mesh into a GeometryData object"""
-    theMesh = meshObj.data
+def read_mesh_array(collection, propertyName, dtype, width = 1):
+    """returns an array with the property's values for all items of the mesh collection (one row per item if width > 1)"""
+    values = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(propertyName, values)
 
-    theMesh.calc_tangents()
+    return values.reshape(-1, width) if width > 1 else values
 
-    geom = geomutils.GeometryData()
 
-    bm = bmesh.new()
-    bm.from_mesh(theMesh)
+def get_loop_split_keys(loopVertIndices, loopUvs):
+    """returns an (n, 3) int64 array identifying each loop's (vertex index, uv, uv2) combination.
+    The uvs are compared by their exact values"""
+    splitKeys = np.empty((len(loopVertIndices), 3), dtype=np.int64)
+    splitKeys[:, 0] = loopVertIndices
 
-    geom.shaderIndex = shaderIndex
+    for i, uvs in enumerate(loopUvs[:2]):
+        #adding zero turns -0.0 into 0.0, so that both get the same bits
+        uvBits = (uvs + np.float32(0.0)).view(np.uint32).astype(np.int64)
+        splitKeys[:, i + 1] = (uvBits[:, 0] << 32) | uvBits[:, 1]
 
-    deformlayer = bm.verts.layers.deform.verify()
+    return splitKeys
 
-    skelData = None
 
-    if parentSkeleton is not None:
-        skelData = parentSkeleton.data
-    
-    boneIndexTranslation = {} #vertex group index to skeleton bone index
-
-
-    #vert positions and normals...
-    for vert in bm.verts:
-        vertPos = vert.co.copy().freeze()
-        geom.vertPositions.append(vertPos)
-        geom.vertNormals.append(correctedNormalsPositionsDict[vertPos] if vertPos in correctedNormalsPositionsDict else vert.normal.copy())
-
-        #weights...
-        if skelData is not None:
-            vertBoneIndexes = []
-            vertBoneWeights = []
-            for groupIndex, weight in vert[deformlayer].items():
-                if boneIndexTranslation.get(groupIndex, -1) == -1:
-                    boneIndexTranslation[groupIndex] = skelData.bones.find(meshObj.vertex_groups[groupIndex].name)
-                
-                vertBoneIndexes.append(boneIndexTranslation[groupIndex])
-                vertBoneWeights.append(weight)
-
-            #if this vert has less than 4 bones with weights, pad the indexes and weights lists with empty entries
-            vertBoneIndexes += [1] * (4 - len(vertBoneIndexes))
-            vertBoneWeights += [0.0] * (4 - len(vertBoneWeights))
-
-            geom.boneIndexes.append(vertBoneIndexes)
-            geom.boneWeights.append(vertBoneWeights)
-
-        else:
-            geom.boneIndexes.append([1] * 4)
-            geom.boneWeights.append([0.0] * 4)
-        
+def get_bone_index_map(armatureData):
+    """returns a dict with the index of each of the armature's bones, by name"""
+    return {bone.name: boneIndex for boneIndex, bone in enumerate(armatureData.bones)}
 
-    #store uv layers (always 1, but 2 if we find the second one)     
-    uvlayer = bm.loops.layers.uv.verify()
-    uvlayer2 = None
 
-    if len(bm.loops.layers.uv) > 1:
-        uvlayer = bm.loops.layers.uv[0]
-        uvlayer2 = bm.loops.layers.uv[1]
+def get_vertex_bone_weights(theMesh, meshObj, parentSkeleton, weightPruneThreshold = 0.0):
+    """returns an (n, 4) array of bone indexes and an (n, 4) array of weights with the 4 biggest weights of each vertex,
+    renormalized to add up to 1. Weights below weightPruneThreshold are ignored. Unused weight slots point to bone 1 (with no weight)"""
+    vertCount = len(theMesh.vertices)
 
-    #vertex color layers (should be two but who knows what people are doing)
-    vcLayer = None
-    vcLayer2 = None
+    if parentSkeleton is None:
+        return np.ones((vertCount, 4), dtype=np.uint8), np.zeros((vertCount, 4))
 
-    if len(bm.loops.layers.color) > 0:
-        vcLayer = bm.loops.layers.color[0]
+    boneIndexMap = get_bone_index_map(parentSkeleton.data)
 
-        if len(bm.loops.layers.color) > 1:
-            vcLayer2 = bm.loops.layers.color[1]
+    #vertex group index to skeleton bone index.
+    #Groups without a matching bone can't be stored, so their weights are left out
+    groupBoneIndexes = np.array([boneIndexMap.get(vgroup.name, -1) for vgroup in meshObj.vertex_groups] + [-1], dtype=np.int64)
+    boneGroups = np.flatnonzero(groupBoneIndexes >= 0)
+    groupColumns = np.full(len(groupBoneIndexes), -1, dtype=np.int64)
+    groupColumns[boneGroups] = np.arange(len(boneGroups))
 
-    #fill uvCoords and qtangents with blank entries so that we can fill them in any order
-    geom.uvCoords = [(0.0, 0.0)] * len(geom.vertPositions)
-    geom.uvCoords2 = [(0.0, 0.0)] * len(geom.vertPositions)
-    geom.vColor = [(1.0, 1.0, 1.0, 1.0)] * len(geom.vertPositions)
-    geom.vColor2 = [(0.0, 0.0, 0.0, 0.0)] * len(geom.vertPositions)
-    geom.qtangents = [(0.0, 0.0, 0.0, 0.0)] * len(geom.vertPositions)
+    unmappedGroupNames = [vgroup.name for vgroup in meshObj.vertex_groups if vgroup.name not in boneIndexMap]
 
-    # tangents and bitangents
-    tangentsLayer = "tangents"
-    bitangentssignLayer = "bitangent_sign"
-
-    #indices and uv
-    for face in bm.faces:
-        for vert in face.verts:
-            geom.indices.append(vert.index)
-        for loop in face.loops:
-            if geom.uvCoords[loop.vert.index] == (0.0, 0.0): #only parse this vert if we still don't have this data about it
-                geom.uvCoords[loop.vert.index] = loop[uvlayer].uv.copy()
-                geom.uvCoords[loop.vert.index].y *= -1
-                
-                if uvlayer2 is not None:
-                    geom.uvCoords2[loop.vert.index] = loop[uvlayer2].uv.copy()
-                    geom.uvCoords2[loop.vert.index].y *= -1
-
-                if vcLayer is not None:
-                    geom.vColor[loop.vert.index] = loop[vcLayer].copy()
-                    if vcLayer2 is not None:
-                        geom.vColor2[loop.vert.index] = loop[vcLayer2].copy()
-
-                geom.qtangents[loop.vert.index] = get_loop_tangent(theMesh.loops[loop.index])
-
-    #finally, calculate and store bounds
-    geom.calculate_geometry_bounds()
+    if len(unmappedGroupNames) > 0:
+        print("WARNING: vertex groups of {} without a matching bone in {} are left out: {}".format(meshObj.name, parentSkeleton.name, ", ".join(unmappedGroupNames)))
 
-    bm.free()
+    #read all weights at once into a dense (vertex, bone group) array
+    vertGroupEntries = [(vert.index, group.group, group.weight) for vert in theMesh.vertices for group in vert.groups]
+    groupWeights = np.zeros((vertCount, len(boneGroups)))
+
+    if len(vertGroupEntries) > 0:
+        entryVerts, entryGroups, entryWeights = np.array(vertGroupEntries).T
+        entryColumns = groupColumns[np.minimum(entryGroups.astype(np.int64), len(groupColumns) - 1)]
+        isBoneEntry = entryColumns >= 0
+        groupWeights[entryVerts[isBoneEntry].astype(np.int64), entryColumns[isBoneEntry]] = entryWeights[isBoneEntry]
+
+    weightColumns, vertWeights = mesh_data.limit_vertex_weights(groupWeights, 4, weightPruneThreshold)
+
+    #only the slots of bone groups get a bone index, so -1 (no bone) is never stored
+    boneIndexes = np.ones((vertCount, 4), dtype=mesh_data.get_bone_index_dtype(len(boneIndexMap)))
+    isUsedSlot = weightColumns >= 0
+    boneIndexes[isUsedSlot] = groupBoneIndexes[boneGroups[weightColumns[isUsedSlot]]]
+
+    return boneIndexes, vertWeights
+
+
+def get_loop_tangents(theMesh):
+    """returns an (n, 4) array with the tangent (x,y,z) and bitangent sign (w) of each loop, the tangents data required for OpenIV.
+    Without uv maps, the tangents can't be calculated and are all zero"""
+    loopTangents = np.zeros((len(theMesh.loops), 4), dtype=np.float32)
+
+    if len(theMesh.uv_layers) == 0:
+        return loopTangents
+
+    theMesh.calc_tangents()
+    loopTangents[:, :3] = read_mesh_array(theMesh.loops, "tangent", np.float32, 3)
+    loopTangents[:, 3] = read_mesh_array(theMesh.loops, "bitangent_sign", np.float32)
+
+    return loopTangents
 
-    return geom
 
 # This is not really what we need here. Keeping it here but if it is not needed elsewhere it could be deleted
 # Also haven't renamed "qtangents" into "tangents" throughout the code yet.
@@ -225,7 +236,3 @@ def get_loop_qtangent(loop):
     loopQuat = loopMatrix.to_quaternion()
 
     return list(reversed(loopQuat)) #apparently, the quaternion is stored as ZYXW instead of WXYZ in the .mesh file
-
-def get_loop_tangent(loop):
-    """the tangents data required for OpenIV"""
-    return list(loop.tangent) + [loop.bitangent_sign]
\ No newline at end of file
@@ -1,6 +1,6 @@
 import bpy
-import bmesh
-from mathutils import *
+import numpy as np
+from .core import mesh_data
 
 
 
@@ -10,114 +10,99 @@ def build_geometry(geometry, meshName):
     
     mesh, meshObj = create_mesh(meshName)
     
-    bm = bmesh.new()
-    
-    addedVerts = []
-    
-    #add verts...
-    for i, vertPos in enumerate(geometry.vertPositions):
-        newVert = bm.verts.new(vertPos)
-        newVert.normal = geometry.vertNormals[i]
-        addedVerts.append(newVert)
-    
-    bm.verts.ensure_lookup_table()
-    bm.verts.index_update()
-    
-    #faces
-    addedFaces = []
-    duplicateFaces = 0
-    for i in range(0, len(geometry.indices), 3):
-        try:
-            addedFaces.append(bm.faces.new(addedVerts[j] for j in geometry.indices[i:i+3]))
-        except ValueError:
-            duplicateFaces += 1
+    vertPositions = np.asarray(geometry.vertPositions, dtype=np.float32).reshape(-1, 3)
+    vertCount = len(vertPositions)
+
+    #faces (bmesh used to refuse duplicate and degenerate ones, so we skip them ourselves, along with invalid ones)
+    triangles, triangleReport = mesh_data.validate_triangles(geometry.indices, vertCount)
+
+    #merged geometries were already validated piece by piece, before their indices were offset
+    if geometry.triangleReport is not None:
+        triangleReport = geometry.triangleReport
+
+    if len(triangleReport.outOfRangeTriangles) > 0:
+        print("WARNING: {} faces use indices outside the geometry's vertex count ({})".format(
+            len(triangleReport.outOfRangeTriangles), vertCount))
+
+    loopVertIndices = triangles.ravel()
+
+    #add verts, loops and faces in bulk
+    mesh.vertices.add(vertCount)
+    mesh.vertices.foreach_set("co", vertPositions.ravel())
+
+    mesh.loops.add(len(loopVertIndices))
+    mesh.loops.foreach_set("vertex_index", loopVertIndices)
+
+    mesh.polygons.add(len(triangles))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(loopVertIndices), 3, dtype=np.int32))
+    if (4, 00, 0) > bpy.app.version:
+        mesh.polygons.foreach_set("loop_total", np.full(len(triangles), 3, dtype=np.int32))
+
+    mesh.update(calc_edges=True)
         
-    # uv coords
-    uvlayer = bm.loops.layers.uv.verify()
-    uvlayer2 = None
+    # uv coords (data is per vertex, so we expand it to the loops)
+    uvlayer = mesh.uv_layers.new(name='UVMap')
+    uvlayer.data.foreach_set("uv", np.asarray(geometry.uvCoords, dtype=np.float32)[loopVertIndices].ravel())
 
     if len(geometry.uvCoords2) > 0:
-        uvlayer2 = bm.loops.layers.uv.new('UVMap2')
+        uvlayer2 = mesh.uv_layers.new(name='UVMap2')
+        uvlayer2.data.foreach_set("uv", np.asarray(geometry.uvCoords2, dtype=np.float32)[loopVertIndices].ravel())
 
-    # .. and vertex colour
-    vcLayer = bm.loops.layers.color.new('Color 1')
-    vcLayer2 = bm.loops.layers.color.new('Color 2')
-    
-    for face in addedFaces:
-        for loop in face.loops:
-            # Get the index of the vertex the loop contains.
-            loop[uvlayer].uv = geometry.uvCoords[loop.vert.index]
-            if uvlayer2 is not None:
-                loop[uvlayer2].uv = geometry.uvCoords2[loop.vert.index]
-            
-            loop[vcLayer] = geometry.vColor[loop.vert.index]
-            loop[vcLayer2] = geometry.vColor2[loop.vert.index]
-        
-    bm.faces.ensure_lookup_table()
-
-    #bone weights
-    deformlayer = bm.verts.layers.deform.verify()
-    for i, vert in enumerate(bm.verts):
-        for j in range(4):
-            if geometry.boneWeights[i][j] > 0.0:
-                vgroup = None
-                if meshObj.vertex_groups.find(geometry.boneIndexes[i][j]) == -1:
-                    vgroup = meshObj.vertex_groups.new(name = geometry.boneIndexes[i][j])
-                else:
-                    vgroup = meshObj.vertex_groups[geometry.boneIndexes[i][j]]
-
-                vert[deformlayer][vgroup.index] = geometry.boneWeights[i][j]
-    
-    #finally, add the bmesh to the actual mesh
-    bm.to_mesh(mesh)
-    bm.free()
+    # .. and vertex colour (stored in the 0-255 range)
+    add_vertex_color_layer(mesh, 'Color 1', geometry.vColor / np.float32(255), loopVertIndices)
+    add_vertex_color_layer(mesh, 'Color 2', geometry.vColor2 / np.float32(255), loopVertIndices)
+
+    #bone weights: one vertex group per bone, filled with all vertices sharing each weight value at once
+    for boneIndex, weightGroups in mesh_data.get_vertex_group_assignments(geometry.boneIndexes, geometry.boneWeights):
+        vgroup = meshObj.vertex_groups.new(name = str(boneIndex))
+
+        for weight, vertIndices in weightGroups:
+            vgroup.add(vertIndices, weight, 'REPLACE')
 
     geometry.mesh = mesh
     geometry.meshObj = meshObj
 
-    print("Built mesh: {} ({} duplicate faces were found and skipped)".format(geometry.meshObj.name, duplicateFaces))
+    print("Built mesh: {} ({})".format(geometry.meshObj.name, triangleReport))
     # print("Mesh bounds: {}".format(geometry.calculate_geometry_bounds()))
 
 
-def join_geometries_sharing_mats(geometries):
-    """returns a list of the "unified" geometries"""
-    matIndexesUsed = []
+def add_vertex_color_layer(mesh, layerName, vertColors, loopVertIndices):
+    """adds a color attribute storing one color per vertex (in the point domain).
+    Blender versions without color attributes get a vertex color layer, with the colors expanded to the loops"""
+    if hasattr(mesh, "color_attributes"):
+        colorAttr = mesh.color_attributes.new(layerName, 'BYTE_COLOR', 'POINT')
+        colorAttr.data.foreach_set(get_color_attribute_property(colorAttr), vertColors.ravel())
+    else:
+        vcLayer = mesh.vertex_colors.new(name=layerName)
+        vcLayer.data.foreach_set("color", vertColors[loopVertIndices].ravel())
 
-    joinedGeoms = []
-    
-    for geometry in geometries:
-        if matIndexesUsed.count(geometry.shaderIndex) == 0:
-            matIndexesUsed.append(geometry.shaderIndex)
-            
-    for matIndex in matIndexesUsed:
-        joinedGeoms.append(join_geometries_with_matindex(geometries, matIndex))
 
-    return joinedGeoms
+def get_color_attribute_property(colorAttr):
+    """returns the name of the property holding the color attribute's values as they are stored,
+    without color space conversions"""
+    if colorAttr.data_type == 'BYTE_COLOR' and (3, 4, 0) <= bpy.app.version:
+        return "color_srgb"
 
+    return "color"
 
-def join_geometries_with_matindex(geometries, matIndex):
-    """returns the "base geometry", the one that should contain the others sharing the same matIndex"""
-    baseGeom = None
-    geomsToJoin = []
-    
-    for geometry in geometries:
-        if geometry.shaderIndex == matIndex:
-            if baseGeom is None:
-                baseGeom = geometry
-            geomsToJoin.append(geometry)
-    
-    if(len(geomsToJoin) > 1):
-        #join!
-        contextOverride = {}
-        contextOverride["object"] = contextOverride["active_object"] = baseGeom.meshObj
-        contextOverride["selected_objects"] = contextOverride["selected_editable_objects"] = [g.meshObj for g in geomsToJoin]
-        if (4, 00, 0) > bpy.app.version:
-            bpy.ops.object.join(contextOverride)
-        else:
-            with bpy.context.temp_override(**contextOverride):
-                bpy.ops.object.join()
 
-    return baseGeom
+def get_color_attributes_data(mesh, domain):
+    """returns a list with an (n, 4) array of colors for each color attribute of the mesh in the domain ('POINT' or 'CORNER').
+    Blender versions without color attributes only have vertex color layers, in the corner domain"""
+    colorsData = []
+    itemCount = len(mesh.vertices) if domain == 'POINT' else len(mesh.loops)
+
+    if hasattr(mesh, "color_attributes"):
+        colorLayers = [colorAttr for colorAttr in mesh.color_attributes if colorAttr.domain == domain]
+    else:
+        colorLayers = list(mesh.vertex_colors) if domain == 'CORNER' else []
+
+    for colorLayer in colorLayers:
+        colors = np.empty(itemCount * 4, dtype=np.float32)
+        colorLayer.data.foreach_get(get_color_attribute_property(colorLayer) if hasattr(colorLayer, "data_type") else "color", colors)
+        colorsData.append(colors.reshape(-1, 4))
+
+    return colorsData
 
 
 def create_mesh(meshName):
@@ -133,40 +118,3 @@ def create_mesh(meshName):
 def delete_mesh(mesh):
     """Deletes the target mesh (mesh obj will also be deleted)"""
     bpy.data.meshes.remove(mesh)
-
-
-class GeometryData():
-    """class representing most of the data stored in a .mesh file, especially in the 'Geometry' sections"""
-    def __init__(self):
-        self.mesh = None
-        self.meshObj = None
-        self.vertPositions = [] #list of vectors
-        self.vertNormals = [] #list of vectors
-        self.shaderIndex = 0
-        self.indices = [] #list of ints - vertex indices, in the winding order, in order to make faces
-        self.uvCoords = [] #list of vectors (y axis is flipped, apparently)
-        self.uvCoords2 = [] #list of vectors (y axis is flipped, apparently). Not necessarily used
-        self.vColor = [] # list of vertex colors from channel 1
-        self.vColor2 = [] # list of vertex colors from channel 2
-        self.boneIndexes = [] #list of lists, each inner list having 4 ints
-        self.boneWeights = [] #list of lists, each inner list having 4 floats
-        self.bounds = None #dict with 'max' and 'min' vectors
-        self.qtangents = [] #list of tangents (x,y,z) and bitangents signs (w), one per vertex, representing tangent space (for normal mapping)
-
-    def calculate_geometry_bounds(self):
-        """fills this geometry's 'bounds' variable; also returns it"""
-        minBounds = Vector()
-        maxBounds = Vector()
-
-        for vertPos in self.vertPositions:
-            for i in range(3):
-                if minBounds[i] > vertPos[i]:
-                    minBounds[i] = vertPos[i]
-                
-                if maxBounds[i] < vertPos[i]:
-                    maxBounds[i] = vertPos[i]
-
-
-        self.bounds = { 'max' : maxBounds, 'min' : minBounds }
-
-        return self.bounds
\ No newline at end of file
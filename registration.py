@@ -0,0 +1,82 @@
+import bpy
+from bpy.props import StringProperty, BoolProperty, IntProperty
+from .core import cache_utils
+from . import import_mesh
+from . import export_mesh
+from . import import_skel
+from . import import_odr
+from . import import_odd
+
+class GtaIOPanel(bpy.types.Panel):
+    """Panel containing import/export options in the Scene tab"""
+    bl_label = "GTA5 Ped I/O"
+    bl_idname = "SCENE_PT_GTA5_PED"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "scene"
+
+    def draw(self, context):
+        pass
+        #layout = self.layout
+        #curScene = context.scene
+        
+
+def update_import_cache_settings(prefs, context):
+    """applies the cache settings from the addon preferences"""
+    cacheDir = bpy.path.abspath(prefs.importCacheDir) if prefs.importCacheDir else None
+    cache_utils.configure_import_cache(cacheDir, prefs.importCacheMaxSizeMB, prefs.useImportCache)
+
+
+class GtaIOPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    useImportCache: BoolProperty(
+        name="Cache Imported Data",
+        description="Store parsed .mesh and .skel data on disk, so that importing the same files again is faster",
+        default=True,
+        update=update_import_cache_settings,
+    )
+
+    importCacheDir: StringProperty(
+        name="Cache Directory",
+        description="Where the import cache is stored. If empty, a folder in the system's temp directory is used",
+        subtype='DIR_PATH',
+        default="",
+        update=update_import_cache_settings,
+    )
+
+    importCacheMaxSizeMB: IntProperty(
+        name="Cache Size Limit (MB)",
+        description="When the cache grows beyond this size, the least recently used entries are deleted",
+        default=cache_utils.DEFAULT_MAX_SIZE_MB,
+        min=0,
+        update=update_import_cache_settings,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "useImportCache")
+        layout.prop(self, "importCacheDir")
+        layout.prop(self, "importCacheMaxSizeMB")
+        
+
+def register():
+    bpy.utils.register_class(GtaIOPreferences)
+
+    addon = bpy.context.preferences.addons.get(__package__)
+    if addon is not None:
+        update_import_cache_settings(addon.preferences, bpy.context)
+
+    import_mesh.register()
+    import_skel.register()
+    import_odr.register()
+    import_odd.register()
+    export_mesh.register()
+
+def unregister():
+    import_mesh.unregister()
+    import_skel.unregister()
+    import_odr.unregister()
+    import_odd.unregister()
+    export_mesh.unregister()
+    bpy.utils.unregister_class(GtaIOPreferences)
@@ -2,54 +2,55 @@ import bpy
 from mathutils import *
 
 
-def create_new_bone(armature, boneName, parentPoseBone = None):
-    """goes into edit mode, creates a new bone with the target parent, then exits edit mode"""
+#length of the created bones; the .skel files only store the bones' transforms
+BONE_LENGTH = 0.02
+
+
+def create_bones(armature, skeletonData):
+    """goes into edit mode, creates each bone of the SkeletonData at its rest transform,
+    then goes back into object mode. Returns the new bones' names, in the same order"""
+    boneMatrices = get_bone_rest_matrices(skeletonData)
+
     bpy.ops.object.mode_set(mode="EDIT")
-    
-    newEditBone = armature.edit_bones.new(boneName)
-    
-    boneData = GTABone()
-    
-    #print("creating new bone: {}, parent: {}".format(newEditBone.name, parentPoseBone))
-    
-    if parentPoseBone is not None:
-        parentBone = armature.edit_bones[parentPoseBone.name]
-        newEditBone.parent = parentBone
-        #newEditBone.use_connect = True
-        newEditBone.head = parentPoseBone.head
-        #print("set head to parent's pose head: {}".format(parentPoseBone.head))
-        newEditBone.tail = parentPoseBone.tail
-    else:
-        #print("no parent, setting tail: {}".format(newEditBone.head))
-        newEditBone.tail = newEditBone.head
-        newEditBone.tail.y -= 0.02
-        
-    newBoneName = newEditBone.name
-    
-    bpy.ops.object.mode_set(mode="POSE")
-    
-    boneData.name = newBoneName
-    
-    return boneData
 
+    newEditBones = []
 
-def apply_bone_data(boneData):
-    #print("applying gathered bone data for bone {}".format(boneData.name))
-    
-    poseBone = boneData.poseBone
-    
-    if boneData.rotationQuat is not None:
-        # Blenders order is [x, y, z, w] but bone Data stores it [w, x, y, z] so we have to shift the values
-        poseBone.rotation_quaternion.w = boneData.rotationQuat.z
-        poseBone.rotation_quaternion.x = boneData.rotationQuat.w
-        poseBone.rotation_quaternion.y = boneData.rotationQuat.x
-        poseBone.rotation_quaternion.z = boneData.rotationQuat.y
+    for boneName, parentIndex, boneMatrix in zip(skeletonData.names, skeletonData.parentIndexes.tolist(), boneMatrices):
+        newEditBone = armature.edit_bones.new(boneName)
+        newEditBone.tail.y = BONE_LENGTH
+        #setting the matrix keeps the bone's length
+        newEditBone.matrix = boneMatrix
 
-    if boneData.location is not None:
-        # To make it clear: these are local offsets from the parent bone in local space coordinates
-        poseBone.location.x = boneData.location.x # x is the bone's forward axis and most offsets are applied here
-        poseBone.location.y = boneData.location.y
-        poseBone.location.z = boneData.location.z
+        if parentIndex >= 0:
+            newEditBone.parent = newEditBones[parentIndex]
+
+        newEditBones.append(newEditBone)
+
+    #the edit bones can't be accessed after leaving edit mode
+    newBoneNames = [editBone.name for editBone in newEditBones]
+
+    bpy.ops.object.mode_set(mode="OBJECT")
+
+    return newBoneNames
+
+
+def get_bone_rest_matrices(skeletonData):
+    """returns the armature space rest matrix of each bone of the SkeletonData,
+    combining the LocalOffset and RotationQuaternion of the bone and all its parents"""
+    boneMatrices = []
+
+    for parentIndex, location, rotationQuat in zip(skeletonData.parentIndexes.tolist(), skeletonData.locations.tolist(), skeletonData.rotationQuats.tolist()):
+        # Blenders order is [w, x, y, z] but the file stores it [x, y, z, w] so we have to shift the values
+        x, y, z, w = rotationQuat
+        # To make it clear: the locations are local offsets from the parent bone in local space coordinates
+        localMatrix = Matrix.Translation(location) @ Quaternion((w, x, y, z)).normalized().to_matrix().to_4x4()
+
+        if parentIndex >= 0:
+            localMatrix = boneMatrices[parentIndex] @ localMatrix
+
+        boneMatrices.append(localMatrix)
+
+    return boneMatrices
 
 
 def create_armature(armatureName):
@@ -65,12 +66,3 @@ def create_armature(armatureName):
 def delete_armature(armature):
     """Deletes the target armature (armature obj will also be deleted)"""
     bpy.data.armatures.remove(armature)
-
-
-class GTABone:
-    def __init__(self):
-        self.name = None
-        self.poseBone = None
-        self.location = None
-        self.rotationQuat = None
-        self.scale = None
\ No newline at end of file